@@ -0,0 +1,126 @@
+"""Soundtrack mixing
+
+Every voiceover and the music track are decoded once into arrays, laid out on
+the video timeline, mixed with the music ducked under speech, normalized to a
+target loudness (ITU-R BS.1770 integrated loudness) and written as one track,
+so the final encode only has to compress a finished WAV.
+"""
+import os
+import math
+from typing import List, Optional, Tuple
+import numpy as np
+from segment_renderer import AUDIO_FPS
+from audio_synth import LOOP_CROSSFADE, decode, encode, fade, loop_to_length
+
+TARGET_LUFS = float(os.getenv("AUDIO_TARGET_LUFS", -14))  # Streaming platforms normalize to about -14 LUFS
+PEAK_CEILING_DB = -1.0  # Never let normalization push peaks above this, even if the target is missed
+DUCK_DB = float(os.getenv("AUDIO_DUCK_DB", -12))  # Music level change while someone is speaking
+SPEECH_THRESHOLD_DB = -45.0  # Voice windows louder than this count as speech
+DUCK_WINDOW = 0.02  # Seconds per speech detection window
+DUCK_HOLD = 0.3  # Keep the music down across short pauses between words
+DUCK_RAMP = 0.15  # Seconds to fade the music down or back up
+MUSIC_FADE_OUT = 0.5
+
+# BS.1770 K-weighting at 48 kHz: a high shelf (head effects) followed by a high pass
+SHELF_B, SHELF_A = (1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585)
+HIGHPASS_B, HIGHPASS_A = (1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621)
+K_WEIGHTING_RATE = 48000
+
+def k_weighting_response(frequencies: np.ndarray) -> np.ndarray:
+    """Get the magnitude of the K-weighting filter at the given frequencies
+
+    The reference 48 kHz filters are evaluated at each physical frequency, so the
+    response holds at any sample rate up to 48 kHz.
+    """
+    z = np.exp(-1j * 2 * np.pi * np.minimum(frequencies, K_WEIGHTING_RATE / 2) / K_WEIGHTING_RATE)  # z^-1
+
+    def biquad(b, a):
+        return (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+
+    return np.abs(biquad(SHELF_B, SHELF_A) * biquad(HIGHPASS_B, HIGHPASS_A))
+
+def integrated_loudness(samples: np.ndarray, sample_rate: int = AUDIO_FPS) -> float:
+    """Measure gated integrated loudness in LUFS (-inf for silence)
+
+    Only the energy of the K-weighted signal matters, so the filter is applied as
+    a magnitude response in the frequency domain.
+    """
+    if len(samples) == 0:
+        return float("-inf")
+    spectrum = np.fft.rfft(samples, axis=0)
+    spectrum *= k_weighting_response(np.fft.rfftfreq(len(samples), 1 / sample_rate))[:, None]
+    weighted = np.fft.irfft(spectrum, n=len(samples), axis=0)
+
+    # 400 ms blocks with 75% overlap, mean square summed over channels
+    block, step = int(0.4 * sample_rate), int(0.1 * sample_rate)
+    energy = np.concatenate([[0.0], np.cumsum(np.sum(weighted ** 2, axis=1))])
+    if len(samples) < block:
+        powers = np.array([energy[-1] / len(samples)])
+    else:
+        starts = np.arange(0, len(samples) - block + 1, step)
+        powers = (energy[starts + block] - energy[starts]) / block
+    loudness = -0.691 + 10 * np.log10(np.maximum(powers, 1e-20))
+    gated = powers[loudness > -70]  # Absolute gate
+    if len(gated) == 0:
+        return float("-inf")
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10
+    gated = powers[(loudness > -70) & (loudness > relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+def normalize(samples: np.ndarray, sample_rate: int = AUDIO_FPS, target: float = TARGET_LUFS) -> Tuple[np.ndarray, float]:
+    """Scale a track to the target loudness, limited by the peak ceiling; returns the track and its gain in dB"""
+    loudness = integrated_loudness(samples, sample_rate)
+    peak = float(np.max(np.abs(samples))) if len(samples) else 0.0
+    if not math.isfinite(loudness) or peak == 0:
+        return samples, 0.0
+    gain_db = min(target - loudness, PEAK_CEILING_DB - 20 * math.log10(peak))
+    return (samples * 10 ** (gain_db / 20)).astype(np.float32), gain_db
+
+def duck_gain(voice: np.ndarray, sample_rate: int = AUDIO_FPS, depth_db: float = DUCK_DB) -> np.ndarray:
+    """Get a per-sample music gain that dips by depth_db wherever the voice track has speech"""
+    hop = max(1, int(DUCK_WINDOW * sample_rate))
+    windows = len(voice) // hop + 1
+    padded = np.zeros((windows * hop, voice.shape[1]), dtype=np.float32)
+    padded[:len(voice)] = voice
+    power = np.mean(padded.reshape(windows, hop, -1) ** 2, axis=(1, 2))
+    speech = 10 * np.log10(np.maximum(power, 1e-12)) > SPEECH_THRESHOLD_DB
+    # Hold the dip across short pauses, then ramp between levels instead of switching
+    hold = max(1, int(DUCK_HOLD / DUCK_WINDOW))
+    speech = np.convolve(speech, np.ones(hold), mode="same") > 0
+    levels = np.where(speech, 10 ** (depth_db / 20), 1.0)
+    ramp = max(1, int(DUCK_RAMP / DUCK_WINDOW))
+    levels = np.convolve(np.pad(levels, ramp // 2, mode="edge"), np.ones(ramp) / ramp, mode="valid")[:windows]
+    centers = np.arange(windows) * hop + hop / 2
+    return np.interp(np.arange(len(voice)), centers, levels).astype(np.float32)
+
+def mix_soundtrack(voices: List[Tuple[str, float, float]], duration: float, music_path: Optional[str] = None,
+                   music_volume: float = 0.3, sample_rate: int = AUDIO_FPS) -> Tuple[np.ndarray, float]:
+    """Mix voiceovers, given as (path, start, max seconds), with looped and ducked music
+
+    Returns the normalized track and the normalization gain in dB.
+    """
+    length = int(round(duration * sample_rate))
+    voice_track = np.zeros((length, 2), dtype=np.float32)
+    decoded = {}  # A voiceover shared by several segments is decoded once
+    for path, start, seconds in voices:
+        if path not in decoded:
+            decoded[path] = decode(path, sample_rate)
+        offset = int(round(start * sample_rate))
+        clip = decoded[path][:min(int(seconds * sample_rate), length - offset)]  # Trim to the segment
+        voice_track[offset:offset + len(clip)] += clip
+
+    mix = voice_track
+    if music_path:
+        music = decode(music_path, sample_rate)
+        if len(music):
+            music = loop_to_length(music, length, int(LOOP_CROSSFADE * sample_rate))
+            music = fade(music, fade_out=min(MUSIC_FADE_OUT, duration / 4), sample_rate=sample_rate)
+            mix = voice_track + music * (music_volume * duck_gain(voice_track, sample_rate))[:, None]
+    return normalize(mix, sample_rate)
+
+def write_soundtrack(path: str, voices: List[Tuple[str, float, float]], duration: float, music_path: Optional[str] = None,
+                     music_volume: float = 0.3, sample_rate: int = AUDIO_FPS) -> str:
+    """Mix the soundtrack of a video and write it as a WAV for the final encode"""
+    track, _ = mix_soundtrack(voices, duration, music_path, music_volume, sample_rate)
+    encode(track, path, sample_rate)
+    return path
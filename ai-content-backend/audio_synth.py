@@ -0,0 +1,69 @@
+import math
+import subprocess
+from typing import Sequence
+import numpy as np
+from segment_renderer import AUDIO_FPS, ffmpeg_binary
+
+LOOP_CROSSFADE = 0.05  # Seconds blended at each loop seam so repeats don't click
+
+def tone(frequency: float, duration: float, level: float = 0.5, sample_rate: int = AUDIO_FPS) -> np.ndarray:
+    """Synthesize a stereo sine tone as a (samples, 2) float32 array"""
+    t = np.arange(int(duration * sample_rate), dtype=np.float32) / sample_rate
+    mono = level * np.sin(2 * np.pi * frequency * t)
+    return np.repeat(mono[:, None], 2, axis=1)
+
+def bed(root: float, duration: float, level: float = 0.5, sample_rate: int = AUDIO_FPS,
+        intervals: Sequence[float] = (1.0, 1.5, 2.0), tremolo: float = 0.25) -> np.ndarray:
+    """Synthesize a soft chord pad (root, fifth and octave by default) with a slow tremolo"""
+    t = np.arange(int(duration * sample_rate), dtype=np.float32) / sample_rate
+    mono = sum(np.sin(2 * np.pi * root * ratio * t) / (n + 1) for n, ratio in enumerate(intervals))
+    mono *= 1 - 0.3 * (0.5 + 0.5 * np.sin(2 * np.pi * tremolo * t))
+    mono *= level / np.max(np.abs(mono))
+    return np.repeat(mono[:, None], 2, axis=1).astype(np.float32)
+
+def fade(samples: np.ndarray, fade_in: float = 0.0, fade_out: float = 0.0, sample_rate: int = AUDIO_FPS) -> np.ndarray:
+    """Apply linear fades to the start and end of a track"""
+    samples = samples.copy()
+    n_in = min(len(samples), int(fade_in * sample_rate))
+    n_out = min(len(samples), int(fade_out * sample_rate))
+    if n_in:
+        samples[:n_in] *= np.linspace(0, 1, n_in, dtype=np.float32)[:, None]
+    if n_out:
+        samples[-n_out:] *= np.linspace(1, 0, n_out, dtype=np.float32)[:, None]
+    return samples
+
+def loop_to_length(samples: np.ndarray, length: int, crossfade: int) -> np.ndarray:
+    """Repeat a track to exactly length samples, crossfading each seam"""
+    if len(samples) >= length:
+        return samples[:length]
+    crossfade = min(crossfade, len(samples) // 3)
+    if crossfade == 0:
+        return np.resize(samples, (length, samples.shape[1]))
+    ramp = np.linspace(0, 1, crossfade, dtype=np.float32)[:, None]
+    seam = samples[-crossfade:] * (1 - ramp) + samples[:crossfade] * ramp
+    # Every repeat after the first starts on the blended seam instead of a hard cut
+    period = np.concatenate([seam, samples[crossfade:-crossfade]])
+    first = samples[:-crossfade]
+    repeats = math.ceil((length - len(first)) / len(period))
+    return np.concatenate([first, np.tile(period, (repeats, 1))])[:length]
+
+def decode(path: str, sample_rate: int = AUDIO_FPS) -> np.ndarray:
+    """Decode an audio file to a (samples, 2) float32 array with ffmpeg"""
+    result = subprocess.run(
+        [ffmpeg_binary(), "-loglevel", "error", "-i", path, "-f", "f32le", "-ac", "2", "-ar", str(sample_rate), "pipe:1"],
+        capture_output=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg decode failed: {result.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, 2)
+
+def encode(samples: np.ndarray, path: str, sample_rate: int = AUDIO_FPS, bitrate: str = "128k"):
+    """Encode a float32 stereo array in one pass; the container follows the file extension"""
+    codec = ["-c:a", "pcm_s16le"] if path.endswith(".wav") else ["-b:a", bitrate]
+    result = subprocess.run(
+        [ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "f32le", "-ac", "2", "-ar", str(sample_rate), "-i", "pipe:0", *codec, path],
+        input=np.ascontiguousarray(samples, dtype=np.float32).tobytes(),
+        capture_output=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg encode failed: {result.stderr.decode(errors='replace').strip()}")
@@ -0,0 +1,299 @@
+"""Render pipeline benchmark
+
+Renders synthetic timelines through render_video_task in an isolated work
+directory, with gTTS and FAL replaced by local fixtures, and writes wall time,
+peak RSS and output size per case to a JSON report that can be compared
+across commits. Every run starts on a fresh, warmed-up render pool, so its RSS
+never includes memory that workers kept from earlier cases.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --segments 3,8 --media color,image,video --styles standard,fade,zoom \\
+        --resolutions 720p,1080p --captions off,on --qualities final,draft --repeat 3
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import resource
+import zlib
+import statistics
+import subprocess
+from itertools import product
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SEED = 1234
+WORDS = "ai tools make video editing faster and cheaper for every creator on the planet today".split()
+BENCH_VIDEO_ID = 1
+
+def git_commit() -> Optional[str]:
+    """Get the commit being benchmarked, if this is a git checkout"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def process_tree_rss(pid: int) -> int:
+    """Sum the resident memory of a process and its descendants, in bytes (Linux /proc)"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+class PeakRssSampler:
+    """Sample the RSS of this process tree (render workers and ffmpeg included) in the background"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.proc_available = os.path.exists(f"/proc/{os.getpid()}/status")
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.peak = max(self.peak, process_tree_rss(os.getpid()))
+            self.stop_event.wait(self.interval)
+
+    def __enter__(self):
+        if self.proc_available:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        if not self.proc_available:
+            # Without /proc only the lifetime peak of this process is known
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def make_fixtures(ffmpeg: str):
+    """Create the voice, video and image fixtures used in place of gTTS, uploads and FAL"""
+    os.makedirs("fixtures", exist_ok=True)
+    subprocess.run(
+        [ffmpeg, "-y", "-loglevel", "error", "-f", "lavfi", "-i", "sine=frequency=220:duration=2.5", "-ac", "2", "fixtures/voice.mp3"],
+        check=True
+    )
+    subprocess.run(
+        [ffmpeg, "-y", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=1280x720:rate=30:duration=5",
+         "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "assets/videos/bench_clip.mp4"],
+        check=True
+    )
+
+def fixture_image(prompt: str) -> bytes:
+    """Build a deterministic JPEG for a prompt, standing in for a FAL response"""
+    import io
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(zlib.crc32(prompt.encode()))
+    start, end = rng.integers(0, 255, 3), rng.integers(0, 255, 3)
+    ramp = np.linspace(0, 1, 1024)[:, None, None]
+    gradient = (start + (end - start) * ramp).astype(np.uint8)
+    image = Image.fromarray(np.broadcast_to(gradient, (1024, 576, 3)).copy())
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def install_stubs(tts_cache, image_generator):
+    """Replace the network-backed gTTS and FAL calls with the local fixtures"""
+    class FixtureTTS:
+        def __init__(self, text, **kwargs):
+            self.text = text
+
+        def save(self, path):
+            shutil.copyfile("fixtures/voice.mp3", path)
+
+    async def fixture_request_image(payload: Dict) -> bytes:
+        return await asyncio.to_thread(fixture_image, payload["prompt"])
+
+    tts_cache.gTTS = FixtureTTS
+    image_generator.request_image = fixture_request_image
+
+async def build_timeline(image_generator, segments: int, media: str, case_seed: int) -> Dict:
+    """Generate a synthetic timeline; image segments get their image through the (stubbed) FAL path"""
+    rng = random.Random(case_seed)
+    timeline = []
+    for idx in range(segments):
+        segment = {
+            "id": f"bench_{case_seed}_{idx}",
+            "type": "Point",
+            # Every third segment is silent so both the voiced and silent paths are measured
+            "text": "" if idx % 3 == 2 else " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 8))),
+            "duration": rng.choice([2, 3, 4]),
+            "mediaType": media,
+            "background": "#%06x" % rng.randrange(0x1000000),
+            "visualPrompt": f"abstract gradient {case_seed} {idx}"
+        }
+        if media == "image":
+            image = await image_generator.generate_image(segment["visualPrompt"], segment["id"])
+            segment["imageUrl"] = image["url"]
+        elif media == "video":
+            segment["videoUrl"] = "/videos/bench_clip.mp4"
+        timeline.append(segment)
+    return {"segments": timeline, "slideImages": {}, "customVideos": {}}
+
+def fresh_render_pool(segment_renderer):
+    """Replace the render pool with newly started, warmed-up workers"""
+    segment_renderer.shutdown_render_pool()
+    segment_renderer.prewarm_render_pool()
+
+def reset_caches(main):
+    """Drop cached segments and voiceovers so every run renders from scratch"""
+    shutil.rmtree(main.render_cache.CACHE_DIR, ignore_errors=True)
+    os.makedirs(main.render_cache.CACHE_DIR, exist_ok=True)
+    shutil.rmtree(main.tts_cache.TTS_CACHE_DIR, ignore_errors=True)
+    os.makedirs(main.tts_cache.TTS_CACHE_DIR, exist_ok=True)
+    main.render_cache.file_hashes.clear()
+
+async def run_case(main, case: Dict, repeat: int, parallel: bool, warm: bool) -> Dict:
+    """Render one case repeat times and summarize the runs"""
+    case_seed = SEED + zlib.crc32(json.dumps(case, sort_keys=True).encode()) % 10000
+    main.timelines[BENCH_VIDEO_ID] = await build_timeline(main.image_generator, case["segments"], case["media"], case_seed)
+    runs = []
+    for _ in range(repeat):
+        if not warm:
+            reset_caches(main)
+        output_file = main.render_output_path(BENCH_VIDEO_ID, "mp4", case["quality"])
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        run = {}
+        try:
+            if parallel:
+                await asyncio.to_thread(fresh_render_pool, main.segment_renderer)
+            run["idle_rss_mb"] = round(process_tree_rss(os.getpid()) / 1024 ** 2, 1)
+            with PeakRssSampler() as sampler:
+                started_at = time.perf_counter()
+                stages = await main.render_video_task(
+                    BENCH_VIDEO_ID, 1, "mp4", case["resolution"], case["editing_style"], None, 0.3,
+                    case["captions"], "9:16", parallel, case["quality"]
+                )
+                run["wall_time_s"] = round(time.perf_counter() - started_at, 3)
+            run["peak_rss_mb"] = round(sampler.peak / 1024 ** 2, 1)
+            run["output_bytes"] = os.path.getsize(output_file)
+            run["stages_s"] = {stage: round(seconds, 3) for stage, seconds in (stages or {}).items()}
+        except Exception as e:
+            run["error"] = f"{type(e).__name__}: {e}"
+        runs.append(run)
+
+    ok = [run for run in runs if "error" not in run]
+    summary = {**case, "runs": runs}
+    if ok:
+        summary["wall_time_s"] = round(statistics.median(run["wall_time_s"] for run in ok), 3)
+        summary["peak_rss_mb"] = max(run["peak_rss_mb"] for run in ok)
+        summary["idle_rss_mb"] = max(run["idle_rss_mb"] for run in ok)
+        summary["output_bytes"] = ok[-1]["output_bytes"]
+    else:
+        summary["error"] = runs[-1]["error"]
+    return summary
+
+def parse_list(value: str, cast=str) -> List:
+    return [cast(item.strip()) for item in value.split(",") if item.strip()]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the render pipeline on synthetic timelines")
+    parser.add_argument("--segments", default="3,8", help="Segment counts (comma separated)")
+    parser.add_argument("--media", default="color,image,video", help="Media types: color, image, video")
+    parser.add_argument("--captions", default="off,on", help="Caption settings: off, on")
+    parser.add_argument("--styles", default="standard,fade,zoom", help="Editing styles")
+    parser.add_argument("--resolutions", default="720p", help="Resolutions: 720p, 1080p")
+    parser.add_argument("--qualities", default="final", help="Render quality tiers: final, draft")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the median wall time is reported")
+    parser.add_argument("--sequential", action="store_true", help="Render segments in-process instead of in the process pool")
+    parser.add_argument("--warm", action="store_true", help="Keep the segment and TTS caches between runs")
+    parser.add_argument("--output", default="benchmark_report.json", help="Where to write the JSON report")
+    parser.add_argument("--workdir", help="Work directory (defaults to a temporary directory that is removed afterwards)")
+    return parser.parse_args(argv)
+
+async def run_benchmark(args) -> Dict:
+    import main
+    from moviepy.config import get_setting
+
+    make_fixtures(get_setting("FFMPEG_BINARY"))
+    install_stubs(main.tts_cache, main.image_generator)
+    main.videos.add({"id": BENCH_VIDEO_ID, "title": "Benchmark", "status": "draft", "progress": 0, "duration": "", "created": "", "aspect_ratio": "9:16"})
+
+    cases = [
+        {"segments": segments, "media": media, "captions": captions == "on", "editing_style": style, "resolution": resolution, "quality": quality}
+        for segments, media, captions, style, resolution, quality in product(
+            parse_list(args.segments, int), parse_list(args.media), parse_list(args.captions),
+            parse_list(args.styles), parse_list(args.resolutions), parse_list(args.qualities)
+        )
+    ]
+    # Drain encoder progress as the API does; unread progress would also block the pool shutdown
+    loop = asyncio.get_running_loop()
+    listener = threading.Thread(
+        target=main.segment_renderer.listen_progress,
+        args=(lambda event: loop.call_soon_threadsafe(main.dispatch_encoder_progress, event),),
+        name="render-progress",
+        daemon=True
+    )
+    listener.start()
+    results = []
+    try:
+        for n, case in enumerate(cases, 1):
+            result = await run_case(main, case, max(1, args.repeat), not args.sequential, args.warm)
+            results.append(result)
+            outcome = result.get("error") or f"{result['wall_time_s']}s, {result['peak_rss_mb']} MB, {result['output_bytes']} bytes"
+            print(f"[{n}/{len(cases)}] {case}: {outcome}", flush=True)
+    finally:
+        main.segment_renderer.shutdown_render_pool()
+        main.segment_renderer.stop_progress_listener()
+        await asyncio.to_thread(listener.join)
+        main.render_scheduler.store.close()
+
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "render_processes": main.segment_renderer.RENDER_PROCESSES,
+        "parallel": not args.sequential,
+        "warm": args.warm,
+        "repeat": args.repeat,
+        "cases": results
+    }
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    output = os.path.abspath(args.output)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="render_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    # main.py and the renderers use paths relative to the working directory
+    sys.path.insert(0, BACKEND_DIR)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        report = asyncio.run(run_benchmark(args))
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['cases'])} case(s) to {output}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,120 @@
+"""One-time asset bootstrap
+
+Creates the placeholder video and sample music tracks.
+Every created asset is recorded in a manifest with its size, mtime and sha256:
+later boots only stat the files, and hash one only when its stat changed, so
+an intact bootstrap costs a few stat calls instead of re-running moviepy.
+Run `python bootstrap.py` to do this ahead of time (e.g. in an image build).
+"""
+import os
+import json
+import uuid
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional
+
+BOOTSTRAP_VERSION = 3  # Bump when the generated assets change
+MANIFEST_PATH = "assets/.bootstrap.json"
+
+bootstrap_lock = threading.Lock()
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def read_manifest() -> Dict:
+    """Load the manifest, keeping the entries of an older version under previous"""
+    try:
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+        if manifest.get("version") == BOOTSTRAP_VERSION:
+            return manifest
+        return {"version": BOOTSTRAP_VERSION, "assets": {}, "previous": manifest.get("assets", {})}
+    except (OSError, ValueError):
+        pass
+    return {"version": BOOTSTRAP_VERSION, "assets": {}}
+
+def write_manifest(manifest: Dict):
+    temp_path = f"{MANIFEST_PATH}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, MANIFEST_PATH)
+
+def record(path: str) -> Dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(path)}
+
+def is_intact(path: str, entry: Optional[Dict]) -> bool:
+    """Check an asset against its manifest entry, hashing only if its size or mtime changed"""
+    if entry is None or not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    return stat.st_size == entry["size"] and file_sha256(path) == entry["sha256"]
+
+def create_placeholder_video(path: str):
+    import moviepy.editor as mp
+    from caption_raster import caption_clip
+    clip = mp.ColorClip(size=(720, 1280), color=(255, 255, 255), duration=5)  # White background for light theme
+    txt_clip = caption_clip("Sample Video", clip.w, font_size=70, color=(0, 0, 0))
+    txt_clip = txt_clip.set_position('center').set_duration(5)
+    final_clip = mp.CompositeVideoClip([clip, txt_clip])
+    final_clip.write_videofile(path, fps=30)
+
+def sample_music_creator(frequency: float, level: float) -> Callable[[str], None]:
+    """Build the creator of a 30-second placeholder pad, synthesized as one array"""
+    def create(path: str):
+        import audio_synth
+        samples = audio_synth.bed(frequency, 30, level)
+        audio_synth.encode(audio_synth.fade(samples, fade_in=0.5, fade_out=0.5), path)
+    return create
+
+def default_assets() -> Dict[str, Callable[[str], None]]:
+    """Map every bootstrap asset path to the function that creates it"""
+    return {
+        "assets/videos/placeholder.mp4": create_placeholder_video,
+        "assets/audio/energetic.mp3": sample_music_creator(440, 0.5),
+        "assets/audio/chill.mp3": sample_music_creator(220, 0.3),
+        "assets/audio/corporate.mp3": sample_music_creator(330, 0.4),
+        "assets/audio/cinematic.mp3": sample_music_creator(110, 0.6)
+    }
+
+def ensure_assets(assets: Dict[str, Callable[[str], None]]) -> Dict[str, List[str]]:
+    """Create missing or damaged assets and record them; returns what was created, adopted or failed"""
+    with bootstrap_lock:
+        manifest = read_manifest()
+        entries = manifest["assets"]
+        previous = manifest.pop("previous", {})
+        report = {"created": [], "adopted": [], "failed": []}
+        for path, create in assets.items():
+            if is_intact(path, entries.get(path)):
+                continue
+            if path not in entries and os.path.exists(path) and os.path.getsize(path) > 0 and not is_intact(path, previous.get(path)):
+                # Supplied by the user: keep it rather than overwrite it; our own older assets are recreated
+                entries[path] = record(path)
+                report["adopted"].append(path)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            root, extension = os.path.splitext(path)
+            temp_path = f"{root}.{uuid.uuid4().hex}.tmp{extension}"  # Keep the extension for moviepy
+            try:
+                create(temp_path)
+                os.replace(temp_path, path)
+                entries[path] = record(path)
+                report["created"].append(path)
+            except Exception as e:
+                print(f"Could not create {path}: {e}")
+                report["failed"].append(path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        if report["created"] or report["adopted"]:
+            write_manifest(manifest)
+        return report
+
+if __name__ == "__main__":
+    print(ensure_assets(default_assets()))
@@ -0,0 +1,85 @@
+"""In-process caption rasterizer
+
+Captions are drawn with Pillow instead of ImageMagick. Fonts are loaded once per
+process and finished rasters are kept in an LRU cache, so a caption repeated
+across segments or renders costs a dictionary lookup.
+"""
+import os
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# A font file path or a name Pillow can find in the system font directories
+CAPTION_FONT = os.getenv("CAPTION_FONT", "Arial")
+FALLBACK_FONTS = ("Arial.ttf", "arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf", "FreeSans.ttf")
+CAPTION_COLOR = (255, 255, 255)
+CAPTION_WIDTH_RATIO = 0.8  # Captions wrap at 80% of the frame width for padding
+LINE_SPACING = 0.25  # Extra space between lines, as a fraction of the font size
+CAPTION_CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", 256))
+
+@lru_cache(maxsize=None)
+def load_font(font: str, size: int):
+    """Load a font once per (font, size); falls back to common sans fonts, then Pillow's bitmap font"""
+    from PIL import ImageFont
+    candidates = [font, f"{font}.ttf"] if not font.lower().endswith((".ttf", ".otf")) else [font]
+    for candidate in [*candidates, *FALLBACK_FONTS]:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    print(f"Caption font {font} not found, using Pillow's default bitmap font")
+    return ImageFont.load_default()
+
+def wrap_lines(text: str, font, max_width: int) -> List[str]:
+    """Greedily wrap words into lines no wider than max_width (a single long word gets its own line)"""
+    lines = []
+    for paragraph in text.splitlines() or [""]:
+        line = ""
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if line and font.getlength(candidate) > max_width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+@lru_cache(maxsize=CAPTION_CACHE_SIZE)
+def render_caption(text: str, width: int, font_size: Optional[int] = None, color: Tuple[int, int, int] = CAPTION_COLOR, font: str = CAPTION_FONT):
+    """Rasterize centered, wrapped caption text for a frame of the given width
+
+    Returns a read-only (height, width * CAPTION_WIDTH_RATIO, 4) uint8 RGBA array.
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+    font_size = font_size or int(width / 20)
+    face = load_font(font, font_size)
+    box_width = int(width * CAPTION_WIDTH_RATIO)
+    lines = wrap_lines(text.strip(), face, box_width)
+    line_height = face.getbbox("Ag")[3]  # Ascent plus descent; the bitmap fallback has no getmetrics
+    step = line_height + int(font_size * LINE_SPACING)
+    image = Image.new("RGBA", (box_width, step * (len(lines) - 1) + line_height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for n, line in enumerate(lines):
+        x = (box_width - face.getlength(line)) / 2
+        draw.text((x, n * step), line, font=face, fill=(*color, 255))
+    raster = np.asarray(image)
+    raster.flags.writeable = False  # Shared through the cache
+    return raster
+
+def caption_clip(text: str, width: int, **style):
+    """Wrap a cached caption raster in a moviepy ImageClip with its alpha as the mask"""
+    import moviepy.editor as mp
+    raster = render_caption(text, width, **style)
+    clip = mp.ImageClip(raster[:, :, :3])
+    return clip.set_mask(mp.ImageClip(raster[:, :, 3] / 255.0, ismask=True))
+
+def save_caption(text: str, width: int, path: str, **style):
+    """Write a caption raster to a PNG (for ffmpeg overlays)"""
+    from PIL import Image
+    Image.fromarray(render_caption(text, width, **style)).save(path, compress_level=1)
+
+def cache_stats():
+    """Get caption raster cache counters"""
+    info = render_caption.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
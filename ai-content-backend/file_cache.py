@@ -0,0 +1,51 @@
+"""Shared housekeeping for the on-disk caches
+
+The segment, TTS and image caches all use a file's mtime as its LRU timestamp
+and evict down to a byte budget. A render pins the cache files it is about to
+use, so another render finishing in the meantime cannot evict them.
+"""
+import os
+import threading
+from collections import Counter
+from typing import Iterable, Optional
+
+pins = Counter()  # path -> number of renders still relying on the file
+pins_lock = threading.Lock()
+
+def pin(path: str) -> str:
+    """Protect a cache file from eviction until it is released"""
+    with pins_lock:
+        pins[path] += 1
+    return path
+
+def release(paths: Iterable[str]):
+    """Drop one pin per path"""
+    with pins_lock:
+        for path in paths:
+            pins[path] -= 1
+            if pins[path] <= 0:
+                del pins[path]
+
+def evict_lru(directory: str, max_bytes: int, suffix: Optional[str] = None) -> int:
+    """Delete least recently used files, skipping pinned ones, until the directory fits in max_bytes
+
+    Callers hold their cache lock so lookups cannot pin a file while it is removed.
+    Returns the number of files deleted.
+    """
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and (suffix is None or entry.name.endswith(suffix)):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    with pins_lock:
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if pins[path] > 0:
+                continue
+            os.remove(path)
+            total -= size
+            evicted += 1
+    return evicted
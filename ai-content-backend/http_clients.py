@@ -0,0 +1,93 @@
+import os
+import time
+import importlib.util
+from typing import Dict
+import httpx
+
+# Read lazily so values from .env apply; base URLs can point at a local stub server for tests
+UPSTREAMS = {
+    "openai": {
+        "base_url": lambda: os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+        "auth": lambda: f"Bearer {os.getenv('OPENAI_API_KEY')}"
+    },
+    "fal": {
+        "base_url": lambda: os.getenv("FAL_BASE_URL", "https://fal.run"),
+        "auth": lambda: f"Key {os.getenv('FAL_API_KEY')}"
+    }
+}
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 10))
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+clients = {}
+stats = {name: {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0, "total_ms": 0.0, "max_ms": 0.0} for name in UPSTREAMS}
+
+def create_client(name: str) -> httpx.AsyncClient:
+    """Create the long-lived client for an upstream"""
+    upstream = UPSTREAMS[name]
+    return httpx.AsyncClient(
+        base_url=upstream["base_url"](),
+        headers={"Authorization": upstream["auth"](), "Content-Type": "application/json"},
+        timeout=60.0,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=30.0
+        ),
+        http2=HTTP2_AVAILABLE
+    )
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Get the shared client for an upstream, creating it on first use"""
+    if name not in clients or clients[name].is_closed:
+        clients[name] = create_client(name)
+    return clients[name]
+
+async def start():
+    """Open one client per upstream (called at app startup, after .env is loaded)"""
+    for name in UPSTREAMS:
+        get_client(name)
+
+async def close():
+    """Close all upstream clients (called at app shutdown)"""
+    for client in clients.values():
+        await client.aclose()
+    clients.clear()
+
+async def post(name: str, path: str, **kwargs) -> httpx.Response:
+    """POST to an upstream through its pooled client, recording latency"""
+    upstream_stats = stats[name]
+    upstream_stats["requests"] += 1
+    upstream_stats["in_flight"] += 1
+    upstream_stats["peak_in_flight"] = max(upstream_stats["peak_in_flight"], upstream_stats["in_flight"])
+    started_at = time.perf_counter()
+    try:
+        response = await get_client(name).post(path, **kwargs)
+        if response.status_code >= 400:
+            upstream_stats["errors"] += 1
+        return response
+    except Exception:
+        upstream_stats["errors"] += 1
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        upstream_stats["in_flight"] -= 1
+        upstream_stats["total_ms"] += elapsed_ms
+        upstream_stats["max_ms"] = max(upstream_stats["max_ms"], elapsed_ms)
+
+def get_http_stats() -> Dict:
+    """Get per-upstream latency and connection pool occupancy"""
+    result = {}
+    for name, upstream_stats in stats.items():
+        client = clients.get(name)
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", [])
+        result[name] = {
+            **upstream_stats,
+            "avg_ms": round(upstream_stats["total_ms"] / upstream_stats["requests"], 1) if upstream_stats["requests"] else 0.0,
+            "open_connections": len(connections),
+            "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "http2": HTTP2_AVAILABLE
+        }
+    return result
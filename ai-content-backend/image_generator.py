@@ -1,64 +1,127 @@
 from fastapi import HTTPException
-import httpx
+import http_clients
+import file_cache
+from request_cache import RequestCache
+import asyncio
 import base64
+import threading
 import os
-from typing import Dict, List
+import json
+import time
+import hashlib
+from typing import Dict, Optional
 
-FAL_API_KEY = os.getenv("FAL_API_KEY")
 generated_images = {}  # Shared with main.py
 
-async def generate_image(prompt: str, segment_id: str, style: str = "realistic", aspect_ratio: str = "9:16"):
-    """Generate an image for a segment using FAL"""
+IMAGE_CACHE_DIR = "assets/images/cache"
+IMAGE_CACHE_TTL = int(os.getenv("IMAGE_CACHE_TTL", 7 * 24 * 3600))  # Entries unused this long expire
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 512 * 1024 ** 2))  # 512 MB
+
+os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+
+image_lock = threading.Lock()  # Cache reads and writes run in worker threads
+
+def fal_payload(prompt: str, style: str, aspect_ratio: str) -> Dict:
+    """Build the FAL request body for a prompt"""
+    return {
+        "prompt": f"{prompt}, {style} style, high quality, detailed",
+        "negative_prompt": "blurry, low quality, distorted, deformed",
+        "width": 512 if aspect_ratio == "9:16" else 720,
+        "height": 912 if aspect_ratio == "9:16" else 1280,
+        "num_inference_steps": 30
+    }
+
+def image_cache_key(payload: Dict) -> str:
+    """Hash a FAL payload, ignoring case and whitespace differences in the prompt"""
+    normalized = {**payload, "prompt": " ".join(payload["prompt"].lower().split())}
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+def read_cached_image(key: str) -> Optional[bytes]:
+    """Get cached image bytes, dropping the entry if it has expired"""
+    path = f"{IMAGE_CACHE_DIR}/{key}.jpg"
+    with image_lock:
+        if not os.path.exists(path):
+            return None
+        if time.time() - os.path.getmtime(path) > IMAGE_CACHE_TTL:
+            os.remove(path)
+            return None
+        os.utime(path)  # mtime doubles as the LRU timestamp
+        with open(path, "rb") as f:
+            return f.read()
+
+def save_image(path: str, image_bytes: bytes):
+    """Write image bytes to a file"""
+    with open(path, "wb") as f:
+        f.write(image_bytes)
+
+def write_cached_image(key: str, image_bytes: bytes):
+    """Store image bytes in the cache and evict down to IMAGE_CACHE_MAX_BYTES"""
+    path = f"{IMAGE_CACHE_DIR}/{key}.jpg"
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    save_image(temp_path, image_bytes)
+    with image_lock:
+        os.replace(temp_path, path)
+        image_cache_stats["evictions"] += file_cache.evict_lru(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, ".jpg")
+
+image_cache = RequestCache("image", read_cached_image, write_cached_image, offload=True)
+image_cache_stats = image_cache.stats
+
+async def request_image(payload: Dict) -> bytes:
+    """Call FAL and return the decoded image"""
+    response = await http_clients.post("fal", "/fal-ai/stable-diffusion", json=payload)
+    
+    if response.status_code != 200:
+        print("FAL Error:", response.text)
+        raise HTTPException(status_code=500, detail=f"FAL API error: {response.text}")
+    
+    result = response.json()
+    image_data = result.get("images", [{}])[0].get("base64")
+    if not image_data:
+        raise HTTPException(status_code=500, detail="No image data received from FAL")
+    return base64.b64decode(image_data)
+
+async def fetch_image(payload: Dict, force: bool = False) -> bytes:
+    """Get image bytes for a payload from the cache, an identical in-flight request, or FAL"""
+    return await image_cache.get(image_cache_key(payload), lambda: request_image(payload), "fal", force)
+
+async def generate_image(prompt: str, segment_id: str, style: str = "realistic", aspect_ratio: str = "9:16", force: bool = False):
+    """Generate an image for a segment using FAL, reusing cached results unless forced"""
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                "https://fal.run/fal-ai/stable-diffusion",
-                headers={
-                    "Authorization": f"Key {FAL_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "prompt": f"{prompt}, {style} style, high quality, detailed",
-                    "negative_prompt": "blurry, low quality, distorted, deformed",
-                    "width": 512 if aspect_ratio == "9:16" else 720,
-                    "height": 912 if aspect_ratio == "9:16" else 1280,
-                    "num_inference_steps": 30
-                }
-            )
-            
-            if response.status_code != 200:
-                print("FAL Error:", response.text)
-                raise HTTPException(status_code=500, detail=f"FAL API error: {response.text}")
+        image_bytes = await fetch_image(fal_payload(prompt, style, aspect_ratio), force)
             
-            result = response.json()
-            image_data = result.get("images", [{}])[0].get("base64")
-            if not image_data:
-                raise HTTPException(status_code=500, detail="No image data received from FAL")
-            
-            image_id = f"img_{segment_id}_{int(time.time())}"
-            image_path = f"assets/images/{image_id}.jpg"
-            image_bytes = base64.b64decode(image_data)
-            with open(image_path, "wb") as f:
-                f.write(image_bytes)
+        image_id = f"img_{segment_id}_{int(time.time())}"
+        image_path = f"assets/images/{image_id}.jpg"
+        await asyncio.to_thread(save_image, image_path, image_bytes)
             
-            if segment_id not in generated_images:
-                generated_images[segment_id] = []
+        if segment_id not in generated_images:
+            generated_images[segment_id] = []
             
-            generated_images[segment_id].append({
-                "id": image_id,
-                "path": image_path,
-                "url": f"/images/{image_id}.jpg"
-            })
+        generated_images[segment_id].append({
+            "id": image_id,
+            "path": image_path,
+            "url": f"/images/{image_id}.jpg"
+        })
             
-            return {
-                "image_id": image_id,
-                "url": f"/images/{image_id}.jpg"
-            }
+        return {
+            "image_id": image_id,
+            "url": f"/images/{image_id}.jpg"
+        }
         
     except Exception as e:
         print(f"Error generating image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating image: {str(e)}")
 
+def get_image_cache_stats():
+    """Get hit/miss counters and the current size of the image cache"""
+    files = [entry for entry in os.scandir(IMAGE_CACHE_DIR) if entry.is_file()]
+    return {
+        **image_cache_stats,
+        "in_flight": len(image_cache.inflight),
+        "entries": len(files),
+        "size_bytes": sum(entry.stat().st_size for entry in files),
+        "max_bytes": IMAGE_CACHE_MAX_BYTES
+    }
+
 def get_segment_images(segment_id: str):
     """Get all generated images for a segment"""
     if segment_id in generated_images:
@@ -74,7 +137,7 @@ async def regenerate_image(image_id: str, new_prompt: str, segment_id: str, styl
             os.remove(image_path)
         
         # Generate new image
-        return await generate_image(new_prompt, segment_id, style, aspect_ratio)
+        return await generate_image(new_prompt, segment_id, style, aspect_ratio, force=True)
     except Exception as e:
         print(f"Error regenerating image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error regenerating image: {str(e)}")
\ No newline at end of file
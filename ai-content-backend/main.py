@@ -1,36 +1,53 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Form, Query
+import time
+IMPORT_STARTED_AT = time.perf_counter()  # Module import cost is part of the reported startup time
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Awaitable, Callable
 import os
 import json
 import uuid
-import time
 import asyncio
-import httpx
+import threading
 import base64
 from datetime import datetime
 import shutil
 import random
-from gtts import gTTS
-import moviepy.editor as mp
 import re
 from pathlib import Path
 import io
 from dotenv import load_dotenv
+import segment_renderer
+import render_cache
+import tts_cache
+from render_scheduler import RenderScheduler, PRIORITIES
+import transcriber
+import http_clients
+import image_generator
+import script_generator
+import media_store
+import media_responses
+import progress_events
+import metrics
+import bootstrap
+from video_store import VideoRepository, TimelineRepository
 
 # Load environment variables from .env file
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-FAL_API_KEY = os.getenv("FAL_API_KEY")
+IMAGE_BATCH_CONCURRENCY = int(os.getenv("IMAGE_BATCH_CONCURRENCY", 4))
+IMAGE_BATCH_MAX_CONCURRENCY = int(os.getenv("IMAGE_BATCH_MAX_CONCURRENCY", 16))  # Caps the concurrency a client may ask for
+SCRIPT_BATCH_CONCURRENCY = int(os.getenv("SCRIPT_BATCH_CONCURRENCY", 4))
+SCRIPT_BATCH_MAX_CONCURRENCY = int(os.getenv("SCRIPT_BATCH_MAX_CONCURRENCY", 16))  # Caps the concurrency a client may ask for
 
 # Create directories for storing assets and rendered videos
 os.makedirs("assets/audio", exist_ok=True)
 os.makedirs("assets/images", exist_ok=True)
 os.makedirs("assets/videos", exist_ok=True)
 os.makedirs("rendered", exist_ok=True)
+os.makedirs("rendered/drafts", exist_ok=True)
 os.makedirs("projects", exist_ok=True)
 os.makedirs("templates", exist_ok=True)
 
@@ -81,6 +98,16 @@ class ScriptRequest(BaseModel):
     use_trends: bool = False  # New field for trend-based scripts
     max_words_per_segment: Optional[int] = 8  # Customizable word limit per template
     slide_duration: Optional[int] = 3  # Customizable slide duration (2-4s)
+    force: bool = False  # Bypass the completion cache for deliberate regenerations
+
+class BatchScriptItem(BaseModel):
+    video_id: int
+    request: ScriptRequest
+
+class BatchScriptRequest(BaseModel):
+    items: List[BatchScriptItem]
+    concurrency: Optional[int] = None  # Defaults to SCRIPT_BATCH_CONCURRENCY, capped at SCRIPT_BATCH_MAX_CONCURRENCY
+    force: bool = False  # Bypass the completion cache for every item
 
 class TemplateSchema(BaseModel):
     id: str
@@ -92,28 +119,41 @@ class TemplateSchema(BaseModel):
     captions: bool = False  # Default captions setting
     aspect_ratio: str = "9:16"  # Default aspect ratio (9:16 or 16:9)
 
+class OutputTarget(BaseModel):
+    aspect_ratio: str = "9:16"
+    resolution: str = "720p"
+    format: str = "mp4"  # One of segment_renderer.OUTPUT_FORMATS
+
 class RenderRequest(BaseModel):
     voiceId: int
-    format: str = "mp4"
+    format: str = "mp4"  # One of segment_renderer.OUTPUT_FORMATS; drafts are rendered in it too
     resolution: str = "720p"
     editing_style: str = "standard"
     music_track: Optional[str] = None
     music_volume: float = 0.3
     captions: Optional[bool] = False  # Add captions option
     aspect_ratio: str = "9:16"  # Add aspect ratio option
+    parallel: bool = True  # Render segments in a process pool
+    priority: str = "final"  # "preview" renders are scheduled ahead of "final" ones
+    quality: str = "final"  # "draft" renders a quick 360p/15 fps check to rendered/drafts, ahead of everything else
+    outputs: Optional[List[OutputTarget]] = None  # Several targets are derived from a single render; overrides aspect_ratio, resolution and format
+
+class BatchImageRequest(BaseModel):
+    style: str = "realistic"
+    aspect_ratio: str = "9:16"
+    overwrite: bool = False  # Regenerate segments that already have an image
+    concurrency: Optional[int] = None  # Defaults to IMAGE_BATCH_CONCURRENCY, capped at IMAGE_BATCH_MAX_CONCURRENCY
+    force: bool = False  # Bypass the prompt cache
 
 class GenerateImageRequest(BaseModel):
     prompt: str
     segment_id: str
     style: str = "realistic"
     aspect_ratio: str = "9:16"
-
-class QueueItem(BaseModel):
-    video_id: int
-    render_request: RenderRequest
+    force: bool = False  # Bypass the prompt cache for deliberate regenerations
 
 # In-memory storage until we implement a database
-videos = [
+videos = VideoRepository([
     {
         "id": 1,
         "title": "AI Image Generation Tools",
@@ -141,7 +181,7 @@ videos = [
         "created": "3 days ago",
         "aspect_ratio": "9:16"
     }
-]
+])
 
 # Video templates (stored in templates directory)
 templates = [
@@ -212,9 +252,8 @@ templates = [
 ]
 
 # Store timelines, images, queue, and templates
-timelines = {}
-generated_images = {}
-render_queue = []  # In-memory queue for video rendering
+timelines = TimelineRepository()
+generated_images = image_generator.generated_images  # Shared with image_generator
 template_store = {}  # In-memory template storage (will sync with file)
 
 # Load templates from file on startup
@@ -238,31 +277,42 @@ def save_templates():
 @app.get("/api/videos")
 async def get_videos():
     """Get all videos"""
-    return videos
+    return videos.all()
 
 @app.get("/api/videos/{video_id}")
 async def get_video(video_id: int):
     """Get a specific video"""
-    for video in videos:
-        if video["id"] == video_id:
-            return video
+    video = videos.get(video_id)
+    if video:
+        return video
     raise HTTPException(status_code=404, detail="Video not found")
 
 @app.get("/api/videos/{video_id}/stream")
-async def stream_video(video_id: int):
-    """Stream a video file"""
-    for video in videos:
-        if video["id"] == video_id and video["status"] == "ready":
-            file_path = f"rendered/video_{video_id}.mp4"
-            if os.path.exists(file_path):
-                return FileResponse(file_path)
-            else:
-                placeholder_path = "assets/videos/placeholder.mp4"
-                if os.path.exists(placeholder_path):
-                    return FileResponse(placeholder_path, media_type="video/mp4")
-                raise HTTPException(status_code=404, detail="Video file not found")
+async def stream_video(video_id: int, request: Request):
+    """Stream a video file with byte-range and conditional request support"""
+    video = videos.get(video_id)
+    if video and video["status"] == "ready":
+        file_path = f"rendered/video_{video_id}.mp4"
+        if os.path.exists(file_path):
+            return media_responses.ranged_file_response(request, file_path, "video/mp4")
+        else:
+            placeholder_path = "assets/videos/placeholder.mp4"
+            if os.path.exists(placeholder_path):
+                return media_responses.ranged_file_response(request, placeholder_path, "video/mp4")
+            raise HTTPException(status_code=404, detail="Video file not found")
     raise HTTPException(status_code=404, detail="Video not found or not ready")
 
+@app.get("/api/videos/{video_id}/draft")
+async def stream_draft(video_id: int, request: Request):
+    """Stream the latest draft render of a video"""
+    video = videos.get(video_id)
+    if video and video.get("draft_url"):
+        format = video.get("draft_format", "mp4")
+        file_path = render_output_path(video_id, format, "draft")
+        if os.path.exists(file_path):
+            return media_responses.ranged_file_response(request, file_path, f"video/{format}")
+    raise HTTPException(status_code=404, detail="No draft render for this video")
+
 @app.get("/api/script-templates")
 async def get_script_templates():
     """Get all script templates"""
@@ -310,21 +360,13 @@ async def delete_template(template_id: str):
 @app.post("/api/timeline/{video_id}")
 async def save_timeline(video_id: int, timeline_data: TimelineData):
     """Save a timeline for a video with UI feedback for empty requests"""
-    video_found = False
-    for video in videos:
-        if video["id"] == video_id:
-            video_found = True
-            break
-            
-    if not video_found:
+    if not videos.exists(video_id):
         raise HTTPException(status_code=404, detail="Video not found")
     
     if not timeline_data.segments or all(not s.text for s in timeline_data.segments):
         raise HTTPException(status_code=400, detail="Timeline segments cannot be empty or all textless")
     
-    timelines[video_id] = timeline_data.dict()
-    with open(f"projects/timeline_{video_id}.json", "w") as f:
-        json.dump(timeline_data.dict(), f)
+    timelines[video_id] = timeline_data.dict()  # Written behind by the timeline store
     
     return {"status": "success", "message": "Timeline saved", "slideImages": timeline_data.slideImages, "customVideos": timeline_data.customVideos}
 
@@ -336,14 +378,12 @@ async def get_timeline(video_id: int):
             raise HTTPException(status_code=404, detail="Timeline is empty or has no text")
         return timelines[video_id]
     
-    try:
-        with open(f"projects/timeline_{video_id}.json", "r") as f:
-            timeline = json.load(f)
-            if not timeline["segments"] or all(not s["text"] for s in timeline["segments"]):
-                raise HTTPException(status_code=404, detail="Timeline is empty or has no text")
-            timelines[video_id] = timeline
-            return timeline
-    except:
+    timeline = timelines.load(video_id)
+    if timeline:
+        if not timeline["segments"] or all(not s["text"] for s in timeline["segments"]):
+            raise HTTPException(status_code=404, detail="Timeline is empty or has no text")
+        return timeline
+    else:
         segments = [
             {
                 "id": f"default_{i}_{int(time.time())}",
@@ -359,22 +399,53 @@ async def get_timeline(video_id: int):
             for i, segment_type in enumerate(["Hook", "Intro", "Point", "Conclusion"])
         ]
         timeline = {"segments": segments, "slideImages": {}, "customVideos": {}}
-        timelines[video_id] = timeline
+        timelines.set(video_id, timeline, persist=False)
         if not timeline["segments"] or all(not s["text"] for s in timeline["segments"]):
             raise HTTPException(status_code=404, detail="Default timeline is empty or has no text")
         return timeline
 
+def stream_batch(items: List[Any], label: Callable[[Any], Dict], run: Callable[[Any], Awaitable[Dict]], concurrency: int,
+                 on_finish: Optional[Callable[[List[Dict]], None]] = None) -> StreamingResponse:
+    """Run run(item) for every item, at most concurrency at a time, streaming each result as an NDJSON line
+
+    Each line is label(item) plus the status and either run's result or the error detail.
+    on_finish gets every result produced, even when the client disconnects early.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def guarded(item):
+        async with semaphore:
+            try:
+                return {**label(item), "status": "success", **await run(item)}
+            except HTTPException as e:
+                return {**label(item), "status": "error", "detail": e.detail}
+            except Exception as e:
+                # The response is already streaming, so a failure can only be reported as its own line
+                print(f"Error in batch item {label(item)}: {str(e)}")
+                return {**label(item), "status": "error", "detail": str(e)}
+    
+    async def stream_results():
+        tasks = [asyncio.create_task(guarded(item)) for item in items]
+        results = []
+        try:
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                results.append(result)
+                yield json.dumps(result) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            if on_finish:
+                on_finish(results)
+        generated = sum(1 for result in results if result["status"] == "success")
+        yield json.dumps({"status": "done", "generated": generated, "failed": len(results) - generated}) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @app.post("/api/generate-script/{video_id}")
 async def generate_script(video_id: int, request: ScriptRequest):
     """Generate script content for timeline segments using OpenAI or trends with UI feedback"""
-    video_found = False
-    for video in videos:
-        if video["id"] == video_id:
-            video_found = True
-            video_title = video["title"]
-            break
-            
-    if not video_found:
+    if not videos.exists(video_id):
         raise HTTPException(status_code=404, detail="Video not found")
     
     # Check for empty or invalid requests
@@ -382,188 +453,77 @@ async def generate_script(video_id: int, request: ScriptRequest):
         raise HTTPException(status_code=400, detail="Request fields (title, topic, goal, target_audience) cannot be empty")
     
     try:
-        template = None
-        if request.selected_template:
-            for t in template_store:
-                if t["id"] == request.selected_template:
-                    template = t
-                    break
-        
-        if not template:
-            segment_structure = request.segmentTypes
-            slide_duration = request.slide_duration or 3
-            max_words = request.max_words_per_segment or 8
-        else:
-            segment_structure = [s["type"] for s in template["structure"]]
-            slide_duration = template["slide_duration"]
-            max_words = template["max_words_per_segment"]
-        
-        # Enforce 2-4 seconds per slide and word limit
-        slide_duration = max(2, min(4, slide_duration))
-        max_words = max(0, max_words)  # Allow 0 for silent videos
-
-        # Calculate number of segments based on target duration (if provided)
-        num_segments = len(segment_structure)
-        if request.target_duration:
-            num_segments = max(1, request.target_duration // slide_duration)  # Minimum 1 segment
-            if num_segments < len(segment_structure):
-                segment_structure = segment_structure[:num_segments]
-            elif num_segments > len(segment_structure):
-                segment_structure.extend([segment_structure[-1]] * (num_segments - len(segment_structure)))
-
-        prompt = f"""
-        Create a script for a short-form video about {request.title}.
-        
-        Topic: {request.topic}
-        Goal: {request.goal}
-        Target Audience: {request.target_audience}
-        Tone: {request.tone}
-        """
-        
-        if request.use_trends:
-            prompt += """
-            Use current AI trends from YouTube and TikTok (e.g., AI tools, ethics, education) to generate relevant, engaging content.
-            """
-        else:
-            prompt += f"""
-            The script should be divided into {num_segments} segments, each lasting approximately {slide_duration} seconds.
-            Each segment should have:
-            1. Script text ({max_words} words maximum, conversational, and engaging, or no text if max_words is 0)
-            2. Visual description (what should appear on screen, detailed but brief, for images or videos)
-            
-            Format your response as a JSON array with each segment having:
-            - type: The segment type (e.g., Hook, Intro, Point, Conclusion)
-            - text: The script to be read (1 sentence, max {max_words} words, or empty if max_words is 0)
-            - visualPrompt: Description of what should be shown visually (brief, actionable)
-            
-            Keep the pacing fast to maintain viewer retention for a short-form video.
-            """
-        
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4",
-                    "messages": [
-                        {"role": "system", "content": f"You are an expert scriptwriter for short-form videos, focusing on {slide_duration}-second segments with one sentence per slide (max {max_words} words, or no text if 0), using AI trends if specified."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 1000
-                }
-            )
-            
-            if response.status_code != 200:
-                print("OpenAI Error:", response.text)
-                raise HTTPException(status_code=500, detail=f"OpenAI API error: {response.text}")
-            
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            
-            json_match = re.search(r'\[.*\]', content, re.DOTALL)
-            if json_match:
-                json_content = json_match.group(0)
-            else:
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    json_content = json_match.group(0)
-                else:
-                    raise HTTPException(status_code=500, detail="Failed to parse JSON from OpenAI response")
-            
-            try:
-                segments = json.loads(json_content)
-                if isinstance(segments, dict) and "segments" in segments:
-                    segments = segments["segments"]
-                
-                if len(segments) < len(segment_structure):
-                    while len(segments) < len(segment_structure):
-                        segments.append({
-                            "type": segment_structure[len(segments)],
-                            "text": "",
-                            "visualPrompt": "Generic visual related to the topic"
-                        })
-                segments = segments[:len(segment_structure)]
-                
-                # Validate text length and duration
-                for segment in segments:
-                    words = segment["text"].split()
-                    if len(words) > max_words and max_words > 0:
-                        segment["text"] = " ".join(words[:max_words]) + "..."  # Truncate to max_words
-                    segment["duration"] = slide_duration
-                    segment["captions"] = template["captions"] if template else False
-                
-                timelines[video_id] = {"segments": segments, "slideImages": {}, "customVideos": {}}
-                with open(f"projects/timeline_{video_id}.json", "w") as f:
-                    json.dump({"segments": segments, "slideImages": {}, "customVideos": {}}, f)
-                
-                return {"segments": segments}
-                
-            except json.JSONDecodeError:
-                raise HTTPException(status_code=500, detail="Failed to decode JSON from OpenAI response")
-        
+        segments = await script_generator.generate_script(request.dict(), template_store, request.force)
+        timelines[video_id] = {"segments": segments, "slideImages": {}, "customVideos": {}}
+        return {"segments": segments}
     except Exception as e:
         print(f"Error generating script: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating script: {str(e)}")
 
+@app.post("/api/generate-scripts")
+async def generate_scripts(request: BatchScriptRequest):
+    """Generate scripts for many videos at once, streaming each result as it completes"""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No script requests given")
+    
+    async def generate(item):
+        if not videos.exists(item.video_id):
+            raise HTTPException(status_code=404, detail="Video not found")
+        script = item.request
+        if not script.title or not script.topic or not script.goal or not script.target_audience:
+            raise HTTPException(status_code=400, detail="Request fields (title, topic, goal, target_audience) cannot be empty")
+        segments = await script_generator.generate_script(script.dict(), template_store, request.force or script.force)
+        timelines[item.video_id] = {"segments": segments, "slideImages": {}, "customVideos": {}}
+        return {"segments": segments}
+    
+    concurrency = min(max(1, request.concurrency or SCRIPT_BATCH_CONCURRENCY), SCRIPT_BATCH_MAX_CONCURRENCY)
+    return stream_batch(request.items, lambda item: {"video_id": item.video_id}, generate, concurrency)
+
+@app.get("/api/script-cache")
+async def get_script_cache_stats():
+    """Get completion-level script cache statistics"""
+    return script_generator.get_script_cache_stats()
+
 @app.post("/api/generate-image")
 async def generate_image(request: GenerateImageRequest):
     """Generate an image for a segment using FAL with preview and regeneration support"""
     if not request.prompt:
         raise HTTPException(status_code=400, detail="Prompt cannot be empty")
     
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                "https://fal.run/fal-ai/stable-diffusion",
-                headers={
-                    "Authorization": f"Key {FAL_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "prompt": f"{request.prompt}, {request.style} style, high quality, detailed",
-                    "negative_prompt": "blurry, low quality, distorted, deformed",
-                    "width": 512 if request.aspect_ratio == "9:16" else 720,
-                    "height": 912 if request.aspect_ratio == "9:16" else 1280,
-                    "num_inference_steps": 30
-                }
-            )
-            
-            if response.status_code != 200:
-                print("FAL Error:", response.text)
-                raise HTTPException(status_code=500, detail=f"FAL API error: {response.text}")
-            
-            result = response.json()
-            image_data = result.get("images", [{}])[0].get("base64")
-            if not image_data:
-                raise HTTPException(status_code=500, detail="No image data received from FAL")
-            
-            image_id = f"img_{request.segment_id}_{int(time.time())}"
-            image_path = f"assets/images/{image_id}.jpg"
-            image_bytes = base64.b64decode(image_data)
-            with open(image_path, "wb") as f:
-                f.write(image_bytes)
-            
-            if request.segment_id not in generated_images:
-                generated_images[request.segment_id] = []
-            
-            generated_images[request.segment_id].append({
-                "id": image_id,
-                "path": image_path,
-                "url": f"/images/{image_id}.jpg"
-            })
-            
-            return {
-                "image_id": image_id,
-                "url": f"/images/{image_id}.jpg"
-            }
-        
-    except Exception as e:
-        print(f"Error generating image: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error generating image: {str(e)}")
+    return await image_generator.generate_image(request.prompt, request.segment_id, request.style, request.aspect_ratio, request.force)
+
+@app.post("/api/timeline/{video_id}/generate-images")
+async def generate_timeline_images(video_id: int, request: BatchImageRequest):
+    """Generate images for every segment of a timeline, streaming each result as NDJSON as soon as it is ready"""
+    if video_id not in timelines:
+        raise HTTPException(status_code=404, detail="Timeline not found")
+    
+    timeline = timelines[video_id]
+    if script_generator.assign_segment_ids(timeline["segments"]):
+        timelines.mark_dirty(video_id)  # Results are matched back to segments by id
+    targets = [
+        segment for segment in timeline["segments"]
+        if segment.get("visualPrompt") and (request.overwrite or not segment.get("imageUrl"))
+    ]
+    if not targets:
+        raise HTTPException(status_code=400, detail="No segments with a visualPrompt need images")
+    
+    async def generate(segment):
+        return await image_generator.generate_image(segment["visualPrompt"], segment["id"], request.style, request.aspect_ratio, request.force)
+    
+    def apply_images(results):
+        # Apply every finished image to the timeline in one update
+        images = {result["segment_id"]: result["url"] for result in results if result["status"] == "success"}
+        for segment in timeline["segments"]:
+            if segment["id"] in images:
+                segment["imageUrl"] = images[segment["id"]]
+                segment["mediaType"] = "image"
+        timeline.setdefault("slideImages", {}).update(images)
+        if images:
+            timelines.mark_dirty(video_id)
+    
+    concurrency = min(max(1, request.concurrency or IMAGE_BATCH_CONCURRENCY), IMAGE_BATCH_MAX_CONCURRENCY)
+    return stream_batch(targets, lambda segment: {"segment_id": segment["id"]}, generate, concurrency, apply_images)
 
 @app.post("/api/regenerate-image")
 async def regenerate_image(request: GenerateImageRequest):
@@ -578,13 +538,18 @@ async def regenerate_image(request: GenerateImageRequest):
         if os.path.exists(image_path):
             os.remove(image_path)
         
-        # Generate new image
-        return await generate_image(request)
+        # Generate new image, bypassing the prompt cache
+        return await generate_image(request.model_copy(update={"force": True}))
         
     except Exception as e:
         print(f"Error regenerating image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error regenerating image: {str(e)}")
 
+@app.get("/api/image-cache")
+async def get_image_cache_stats():
+    """Get prompt-level image cache statistics"""
+    return image_generator.get_image_cache_stats()
+
 @app.get("/api/images/{segment_id}")
 async def get_segment_images(segment_id: str):
     """Get all generated images for a segment"""
@@ -596,92 +561,121 @@ async def get_segment_images(segment_id: str):
 async def upload_video(file: UploadFile = File(...), segment_id: str = Form(...)):
     """Upload a custom video for a segment"""
     try:
-        video_path = f"assets/videos/{file.filename}"
-        with open(video_path, "wb") as f:
-            f.write(await file.read())
+        upload = await media_store.save_upload(file)
+        video_url = f"/videos/{upload['filename']}"
         
         if segment_id not in generated_images:
             generated_images[segment_id] = []
         
         generated_images[segment_id].append({
             "id": f"video_{segment_id}_{int(time.time())}",
-            "path": video_path,
-            "url": f"/videos/{file.filename}"
+            "path": upload["path"],
+            "url": video_url
         })
         
         # Update timeline to include custom video
-        for video_id, timeline in timelines.items():
-            for segment in timeline["segments"]:
-                if segment["id"] == segment_id:
-                    segment["videoUrl"] = f"/videos/{file.filename}"
-                    segment["mediaType"] = "video"
-                    with open(f"projects/timeline_{video_id}.json", "w") as f:
-                        json.dump(timeline, f)
-                    return {"status": "success", "videoUrl": f"/videos/{file.filename}"}
+        found = timelines.find_segment(segment_id)
+        if found:
+            video_id, timeline, segment = found
+            segment["videoUrl"] = video_url
+            segment["mediaType"] = "video"
+            timelines.mark_dirty(video_id)
         
-        return {"status": "success", "videoUrl": f"/videos/{file.filename}"}
+        return {"status": "success", "videoUrl": video_url, "sha256": upload["sha256"], "deduplicated": upload["deduplicated"]}
     except Exception as e:
         print(f"Error uploading video: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error uploading video: {str(e)}")
 
+@app.get("/api/upload-video/stats")
+async def get_upload_stats():
+    """Get upload and deduplication counters"""
+    return media_store.get_upload_stats()
+
 @app.post("/api/transcribe-audio")
 async def transcribe_audio(file: UploadFile = File(...)):
     """Transcribe uploaded audio using Whisper"""
+    audio_path = f"assets/audio/upload_{uuid.uuid4().hex}{os.path.splitext(file.filename or '')[1]}"
     try:
-        import whisper
-        model = whisper.load_model("base")
-        audio_path = f"assets/audio/{file.filename}"
         with open(audio_path, "wb") as f:
-            f.write(await file.read())
-        result = model.transcribe(audio_path)
-        os.remove(audio_path)
-        return {"text": result["text"]}
+            while chunk := await file.read(1024 * 1024):
+                f.write(chunk)
+        return await transcriber.transcribe(audio_path)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Transcription error: {str(e)}")
+    finally:
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+
+@app.get("/api/transcribe-audio/status")
+async def get_transcriber_status():
+    """Get the Whisper model pool status"""
+    return transcriber.get_transcriber_stats()
 
 @app.get("/api/audio/preview/{track}")
-async def preview_music(track: str):
-    """Stream a preview of a music track (first 10 seconds)"""
-    music_path = f"assets/audio/{track}.mp3"
+async def preview_music(track: str, request: Request):
+    """Serve a preview of a music track (first 10 seconds, cut once and cached)"""
+    music_path = f"assets/audio/{os.path.basename(track)}.mp3"
     if not os.path.exists(music_path):
         raise HTTPException(status_code=404, detail="Music track not found")
     
-    def iterfile():
-        with open(music_path, "rb") as f:
-            # Read only the first 10 seconds (assuming 44.1kHz, ~441,000 bytes per second)
-            chunk_size = 441000 * 10  # 10 seconds at 44.1kHz
-            data = f.read(chunk_size)
-            while data:
-                yield data
-                data = f.read(chunk_size)
-    
-    return StreamingResponse(iterfile(), media_type="audio/mpeg")
+    try:
+        preview_path = await asyncio.to_thread(media_responses.preview_clip, music_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating preview: {str(e)}")
+    return media_responses.ranged_file_response(request, preview_path, "audio/mpeg")
 
 @app.get("/api/voice/preview")
 async def preview_voice():
     """Stream a preview of a male voice (sample line)"""
     sample_text = "Hello, this is a sample male voice for your video."
-    tts = gTTS(text=sample_text, lang='en', tld='us', gender='male')  # gTTS supports gender='male'
-    audio_file = io.BytesIO()
-    tts.write_to_fp(audio_file)
-    audio_file.seek(0)
-    
-    def iterfile():
-        yield audio_file.read()
-    
-    return StreamingResponse(iterfile(), media_type="audio/mpeg")
+    # Pinned so a render's TTS eviction cannot delete the file while it is being sent
+    audio_file = await asyncio.to_thread(tts_cache.synthesize, sample_text, pin=True)
+    return FileResponse(audio_file, media_type="audio/mpeg", background=BackgroundTask(tts_cache.release, [audio_file]))
 
-async def render_video_task(video_id: int, voice_id: int, format: str, resolution: str, editing_style: str, music_track: Optional[str], music_volume: float, captions: bool, aspect_ratio: str):
+progress_broker = progress_events.ProgressBroker()
+encoder_listeners = {}  # video_id -> handler for encoder progress of its running render
+
+def set_render_progress(video_id: int, progress: int, quality: str = "final", **detail):
+    """Update the rendering progress of a video and push it to watchers (drafts leave the video record alone)"""
+    last = progress_broker.snapshot(video_id).get("progress")
+    if last is None or last["progress"] != progress:
+        render_scheduler.update_progress(video_id, progress)
+        if quality != "draft":
+            videos.update(video_id, progress=progress)
+    progress_broker.publish(video_id, {"type": "progress", "progress": progress, "quality": quality, **detail})
+
+def dispatch_encoder_progress(event: Dict):
+    """Route an encoder progress event from the render workers to its render task"""
+    handler = encoder_listeners.get(event["video_id"])
+    if handler:
+        handler(event)
+
+def render_output_path(video_id: int, format: str, quality: str = "final") -> str:
+    """Get the rendered file of a video; drafts never overwrite the final render"""
+    if quality == "draft":
+        return f"rendered/drafts/video_{video_id}.{format}"
+    return f"rendered/video_{video_id}.{format}"
+
+def target_output_path(video_id: int, target: Dict, primary: bool = False) -> str:
+    """Get the rendered file of an output target; the primary target keeps the usual path"""
+    if primary:
+        return render_output_path(video_id, target["format"])
+    return f"rendered/video_{video_id}_{target['aspect_ratio'].replace(':', 'x')}_{target['resolution']}.{target['format']}"
+
+async def render_video_task(video_id: int, voice_id: int, format: str, resolution: str, editing_style: str, music_track: Optional[str], music_volume: float, captions: bool, aspect_ratio: str, parallel: bool = True, quality: str = "final", outputs: Optional[List[Dict]] = None):
     """Background task to render a video"""
-    video_found = False
-    for i, video in enumerate(videos):
-        if video["id"] == video_id:
-            video_found = True
-            videos[i]["status"] = "rendering"
-            videos[i]["progress"] = 0
-            break
-            
-    if not video_found:
+    draft = quality == "draft"
+    # Drafts are a single quick check, so they ignore extra output targets
+    targets = [] if draft else [dict(key) for key in dict.fromkeys(tuple(sorted(target.items())) for target in outputs or [])]
+    if len(targets) == 1:
+        aspect_ratio, resolution, format = targets[0]["aspect_ratio"], targets[0]["resolution"], targets[0]["format"]
+    targets = targets or [{"aspect_ratio": aspect_ratio, "resolution": resolution, "format": format}]
+    # Several targets share one render: segments are built once on a master frame that covers them all,
+    # then every target is cropped, scaled and captioned from the master in a single ffmpeg run
+    multi = len(targets) > 1
+    if not (videos.exists(video_id) if draft else videos.update(video_id, status="rendering", progress=0)):
         print(f"Video {video_id} not found")
         return
     
@@ -690,202 +684,331 @@ async def render_video_task(video_id: int, voice_id: int, format: str, resolutio
     
     timeline = timelines[video_id]
     segments = timeline["segments"]
-    clips = []
-    audio_clips = []
-    
-    for i, video in enumerate(videos):
-        if video["id"] == video_id:
-            videos[i]["progress"] = 10
-            break
-    
-    # Determine dimensions based on aspect ratio
-    if aspect_ratio == "9:16":
-        clip_width, clip_height = 720, 1280 if resolution == "1080p" else 576, 1024  # 720p or 1080p portrait
-    else:  # 16:9
-        clip_width, clip_height = 1280, 720 if resolution == "1080p" else 1024, 576  # 720p or 1080p landscape
-    
-    total_duration = 0
-    
-    for idx, segment in enumerate(segments):
-        progress = 10 + int(70 * (idx / len(segments)))
-        for i, video in enumerate(videos):
-            if video["id"] == video_id:
-                videos[i]["progress"] = progress
-                break
-                
-        duration = max(2, min(4, segment.get("duration", 3)))  # Enforce 2-4 seconds
+    
+    def report(progress, **detail):
+        set_render_progress(video_id, progress, quality, **detail)
+    
+    report(10)
+    
+    # Each segment is rendered to its own intermediate file, then joined (without re-encoding for mp4).
+    # Segments whose content hash is already cached are reused instead of re-rendered.
+    render_started_at = time.perf_counter()
+    timings = {}  # Wall time per render stage
+    voice = {**segment_renderer.DEFAULT_VOICE, "voice": voice_id}
+    master_size = segment_renderer.master_dimensions(targets) if multi else None
+    jobs = segment_renderer.build_segment_jobs(video_id, segments, resolution, editing_style, captions and not multi, aspect_ratio, quality, master_size)
+    # Drafts override the resolution and style, so label them with what was actually rendered
+    labels = {"resolution": "draft" if draft else "multi" if multi else resolution, "editing_style": jobs[0]["editing_style"], "segments": metrics.segment_bucket(len(segments))}
+    total_duration = sum(job["duration"] for job in jobs)
+    segment_dir = segment_renderer.segment_dir_for(video_id, quality)
+    output_file = f"{segment_dir}/master.mp4" if multi else render_output_path(video_id, format, quality)
+    music_path = f"assets/audio/{music_track}.mp3" if music_track else None
+    audio_bitrate = segment_renderer.DRAFT_AUDIO_BITRATE if draft else None
+    
+    segment_files = [None] * len(jobs)
+    pinned_segments = []  # Cache files this render relies on; released before evicting
+    with metrics.timed(timings, "cache_lookup"):
+        keys = await asyncio.to_thread(lambda: [render_cache.segment_cache_key(job) for job in jobs])
+        stale_jobs = []
+        for job, key in zip(jobs, keys):
+            segment_files[job["index"]] = render_cache.lookup(key)
+            if segment_files[job["index"]]:
+                pinned_segments.append(segment_files[job["index"]])
+            if segment_files[job["index"]] is None and key not in [keys[stale["index"]] for stale in stale_jobs]:
+                stale_jobs.append(job)  # Identical segments are only rendered once
+    
+    audio_files = {}  # text -> voiceover, pinned until the soundtrack is mixed
+    voices = []  # (voiceover, start, seconds) on the video timeline
+    
+    def mix_soundtrack():
+        import audio_mix  # Pulls in numpy, so only on the render path
+        with metrics.timed(timings, "audio"):
+            return audio_mix.write_soundtrack(
+                f"{segment_dir}/soundtrack.wav", voices, total_duration,
+                music_path if music_path and os.path.exists(music_path) else None, music_volume
+            )
+    
+    segment_fractions = {}  # index -> encoded fraction of a segment still rendering
+    
+    def publish_segments(**detail):
+        done = sum(1 for path in segment_files if path)
+        partial = sum(segment_fractions.values())
+        report(10 + int(70 * ((done + partial) / len(jobs))), stage="segments", segments_done=done, segments_total=len(jobs), **detail)
+    
+    def on_encoder_progress(event):
+        if segment_files[event["index"]] is None:
+            segment_fractions[event["index"]] = event["frame"] / event["frames"]
+            publish_segments(segment=event["index"], frame=event["frame"], frames=event["frames"])
+    
+    def finish_segment(job, result):
+        for stage, seconds in result["timings"].items():
+            metrics.SEGMENT_STAGE_SECONDS.observe(seconds, stage=stage, resolution=labels["resolution"], editing_style=labels["editing_style"])
+        path = render_cache.store(keys[job["index"]], job["output"])
+        pinned_segments.append(path)
+        for idx, key in enumerate(keys):
+            if key == keys[job["index"]]:
+                segment_files[idx] = path
+        segment_fractions.pop(job["index"], None)
+        publish_segments(segment=job["index"])
+    
+    loop = asyncio.get_running_loop()
+    
+    def on_concat_progress(seconds):
+        # Called from the concat thread
+        progress = 80 + int((10 if multi else 19) * min(1.0, seconds / total_duration))
+        loop.call_soon_threadsafe(lambda: report(progress, stage="concat", seconds=round(seconds, 2), total_seconds=total_duration))
+    
+    def on_derive_progress(seconds):
+        # Called from the derive thread
+        progress = 90 + int(9 * min(1.0, seconds / total_duration))
+        loop.call_soon_threadsafe(lambda: report(progress, stage="derive", seconds=round(seconds, 2), total_seconds=total_duration))
+    
+    encoder_listeners[video_id] = on_encoder_progress
+    soundtrack_task = None
+    try:
+        # Fetch all voiceover audio concurrently (mostly from the TTS cache); segments are video only
+        with metrics.timed(timings, "tts"):
+            audio_files = await tts_cache.prefetch([job["segment"]["text"] for job in jobs], **voice, pin=True)
+        start = 0
+        for job in jobs:
+            if job["segment"]["text"] in audio_files:
+                voices.append((audio_files[job["segment"]["text"]], start, job["duration"]))
+            start += job["duration"]
+        # The soundtrack is mixed in a thread while the segments render
+        soundtrack_task = asyncio.ensure_future(asyncio.to_thread(mix_soundtrack))
         
-        # Use custom video, image, or color based on mediaType
-        if segment.get("mediaType") == "video" and segment.get("videoUrl"):
-            video_path = f"assets/videos/{os.path.basename(segment['videoUrl'])}"
-            if os.path.exists(video_path):
-                clip = mp.VideoFileClip(video_path).subclip(0, duration)
-                clip = clip.resize(height=clip_height)
-                if clip.w > clip_width:
-                    clip = clip.crop(x_center=clip.w/2, y_center=clip.h/2, width=clip_width, height=clip_height)
-            else:
-                clip = mp.ColorClip(size=(clip_width, clip_height), 
-                                   color=hex_to_rgb(segment.get("background", "#1e293b")), 
-                                   duration=duration)
-        elif segment.get("mediaType") == "image" and segment.get("imageUrl"):
-            image_path = f"assets/images/{os.path.basename(segment['imageUrl'])}"
-            if os.path.exists(image_path):
-                clip = mp.ImageClip(image_path, duration=duration)
-                clip = clip.resize(height=clip_height)
-                if clip.w > clip_width:
-                    clip = clip.crop(x_center=clip.w/2, y_center=clip.h/2, width=clip_width, height=clip_height)
+        with metrics.timed(timings, "segments"):
+            if parallel:
+                pool = segment_renderer.get_render_pool()
+                jobs_by_output = {job["output"]: job for job in stale_jobs}
+                futures = [loop.run_in_executor(pool, segment_renderer.render_segment, job) for job in stale_jobs]
+                try:
+                    for future in asyncio.as_completed(futures):
+                        result = await future
+                        finish_segment(jobs_by_output[result["output"]], result)
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
             else:
-                clip = mp.ColorClip(size=(clip_width, clip_height), 
-                                   color=hex_to_rgb(segment.get("background", "#1e293b")), 
-                                   duration=duration)
-        else:
-            clip = mp.ColorClip(size=(clip_width, clip_height),
-                               color=hex_to_rgb(segment.get("background", "#1e293b")),
-                               duration=duration)
-        
-        if segment["text"] and segment["text"].strip():
-            # Use male voice for TTS
-            tts = gTTS(text=segment["text"], lang='en', tld='us', gender='male', slow=False)
-            audio_file = f"assets/audio/segment_{video_id}_{idx}.mp3"
-            tts.save(audio_file)
-            audio_duration = mp.AudioFileClip(audio_file).duration
-            audio_clip = mp.AudioFileClip(audio_file).subclip(0, duration)  # Trim to match duration
-            audio_clips.append(audio_clip)
+                for job in stale_jobs:
+                    finish_segment(job, await asyncio.to_thread(segment_renderer.render_segment, job))
         
-            # Add captions if enabled
-            if captions:
-                txt_clip = mp.TextClip(
-                    segment["text"], 
-                    fontsize=int(clip_width/20),
-                    color='white',
-                    font='Arial',
-                    size=(clip_width * 0.8, None),  # 80% width for padding
-                    method='caption',
-                    align='center'
-                )
-                txt_clip = txt_clip.set_position(('center', clip_height - 50))  # 50px padding from bottom
-                txt_clip = txt_clip.set_duration(duration)
-                clip = mp.CompositeVideoClip([clip, txt_clip])
-        
-        if editing_style == "zoom":
-            start_scale = 1.0
-            end_scale = 1.2
-            clip = clip.fx(
-                mp.vfx.resize, 
-                lambda t: max(start_scale, min(start_scale + t/duration*(end_scale-start_scale), end_scale))
+        report(80, stage="concat")
+        soundtrack = await soundtrack_task
+        with metrics.timed(timings, "concat"):
+            await asyncio.to_thread(
+                segment_renderer.concat_segments, segment_files, output_file, soundtrack, on_concat_progress, audio_bitrate
             )
-        elif editing_style == "fade":
-            clip = clip.fx(mp.vfx.fadein, 0.5).fx(mp.vfx.fadeout, 0.5)
-        
-        clips.append(clip)
-        total_duration += duration
-        await asyncio.sleep(0.1)  # Reduced sleep for faster rendering
-    
-    for i, video in enumerate(videos):
-        if video["id"] == video_id:
-            videos[i]["progress"] = 80
-            break
-    
-    final_clip = mp.concatenate_videoclips(clips)
-    
-    if audio_clips:
-        final_audio = mp.concatenate_audioclips(audio_clips)
-        if music_track:
-            music_path = f"assets/audio/{music_track}.mp3"
-            if os.path.exists(music_path):
-                music = mp.AudioFileClip(music_path)
-                if music.duration < final_audio.duration:
-                    repeats = int(final_audio.duration / music.duration) + 1
-                    music = mp.concatenate_audioclips([music] * repeats)
-                music = music.subclip(0, final_audio.duration)
-                final_audio = mp.CompositeAudioClip([
-                    final_audio,
-                    music.volumex(music_volume)
-                ])
-        final_clip = final_clip.set_audio(final_audio)
-    
-    output_file = f"rendered/video_{video_id}.{format}"
-    final_clip.write_videofile(output_file, fps=30, codec='libx264', audio_codec='aac')
+        if multi:
+            report(90, stage="derive")
+            derived = []
+            for n, target in enumerate(targets):
+                width, height = segment_renderer.get_render_dimensions(target["resolution"], target["aspect_ratio"])
+                derived.append({"path": target_output_path(video_id, target, n == 0), "width": width, "height": height, "format": target["format"]})
+            with metrics.timed(timings, "derive"):
+                await asyncio.to_thread(
+                    segment_renderer.derive_outputs, output_file, derived,
+                    segment_renderer.caption_timeline(jobs) if captions else [], total_duration, on_derive_progress
+                )
+    finally:
+        encoder_listeners.pop(video_id, None)
+        if soundtrack_task:
+            await asyncio.gather(soundtrack_task, return_exceptions=True)  # Let the mix finish before its directory goes
+        with metrics.timed(timings, "cleanup"):
+            shutil.rmtree(segment_dir, ignore_errors=True)
+            render_cache.release(pinned_segments)
+            tts_cache.release(audio_files.values())
+            await asyncio.to_thread(render_cache.evict)
+            await asyncio.to_thread(tts_cache.evict)
     
     minutes = int(total_duration // 60)
     seconds = int(total_duration % 60)
     duration_str = f"{minutes}:{seconds:02d}"
     
-    for i, video in enumerate(videos):
-        if video["id"] == video_id:
-            videos[i]["status"] = "ready"
-            videos[i]["progress"] = 100
-            videos[i]["duration"] = duration_str
-            break
-    
-    for idx in range(len(segments)):
-        audio_file = f"assets/audio/segment_{video_id}_{idx}.mp3"
-        if os.path.exists(audio_file):
-            os.remove(audio_file)
-
-async def process_render_queue():
-    """Process videos in the render queue sequentially"""
-    global render_queue, videos
-    while render_queue:
-        queue_item = render_queue.pop(0)  # Dequeue first item
-        video_id = queue_item.video_id
-        request = queue_item.render_request
-        try:
-            await render_video_task(video_id, request.voiceId, request.format, request.resolution, request.editing_style, request.music_track, request.music_volume, request.captions, request.aspect_ratio)
-        except Exception as e:
-            print(f"Error rendering video {video_id} from queue: {str(e)}")
-            for i, video in enumerate(videos):
-                if video["id"] == video_id:
-                    videos[i]["status"] = "error"
-                    videos[i]["progress"] = 0
-                    break
+    if draft:
+        videos.update(video_id, draft_url=f"/api/videos/{video_id}/draft", draft_format=format, draft_rendered_at=datetime.now().isoformat())
+    else:
+        rendered = [
+            {**target, "url": "/static/" + os.path.basename(target_output_path(video_id, target, n == 0))}
+            for n, target in enumerate(targets)
+        ]
+        videos.update(video_id, status="ready", duration=duration_str, outputs=rendered)
+    report(100, stage="done")
+    
+    timings["total"] = time.perf_counter() - render_started_at
+    for stage, stage_seconds in timings.items():
+        if stage != "total":
+            metrics.RENDER_STAGE_SECONDS.observe(stage_seconds, stage=stage, **labels)
+    metrics.RENDER_SECONDS.observe(timings["total"], **labels)
+    return timings
+
+async def process_render_job(job: Dict):
+    """Render a job handed out by the render scheduler"""
+    video_id = job["video_id"]
+    request = RenderRequest(**job["request"])
+    try:
+        await render_video_task(
+            video_id, request.voiceId, request.format, request.resolution, request.editing_style, request.music_track, request.music_volume,
+            request.captions, request.aspect_ratio, request.parallel, request.quality,
+            [target.dict() for target in request.outputs] if request.outputs else None
+        )
+        if request.quality == "draft":
+            return {"quality": "draft", "output": render_output_path(video_id, request.format, "draft")}
+        return {"duration": videos.get(video_id)["duration"]}
+    except Exception as e:
+        print(f"Error rendering video {video_id} from queue: {str(e)}")
+        if request.quality != "draft":
+            videos.update(video_id, status="error", progress=0)
+        raise
+
+def on_render_job_change(job: Dict):
+    """Push a job state change, and any queue positions it moved, to watchers"""
+    if job["state"] == "rendering" and job.get("started_at"):
+        metrics.RENDER_QUEUE_WAIT_SECONDS.observe(job["started_at"] - job["enqueued_at"], priority=job["priority"])
+    progress_broker.publish(job["video_id"], {
+        "type": "state",
+        "state": job["state"],
+        "job_id": job["job_id"],
+        "priority": job["priority"],
+        "error": job.get("error")
+    })
+    positions = {queued["video_id"]: i + 1 for i, queued in enumerate(render_scheduler.queued_jobs())}
+    if job["video_id"] not in positions:
+        positions[job["video_id"]] = None
+    for queued_video_id, position in positions.items():
+        last = progress_broker.snapshot(queued_video_id).get("queue")
+        if last is None or last["position"] != position:
+            progress_broker.publish(queued_video_id, {"type": "queue", "position": position})
+
+render_scheduler = RenderScheduler(process_render_job, on_change=on_render_job_change)
+
+def queue_depth_by_priority() -> Dict:
+    """Count queued render jobs per priority"""
+    depth = {(priority,): 0 for priority in PRIORITIES}
+    for job in render_scheduler.queued_jobs():
+        depth[(job["priority"],)] = depth.get((job["priority"],), 0) + 1
+    return depth
+
+metrics.gauge("render_queue_depth", "Render jobs waiting for a worker", queue_depth_by_priority, ["priority"])
+metrics.gauge("render_workers", "Render worker tasks", lambda: render_scheduler.num_workers)
+metrics.gauge("render_workers_busy", "Render workers currently rendering", lambda: render_scheduler.busy)
+metrics.gauge("render_worker_utilization", "Fraction of render workers currently rendering", lambda: render_scheduler.busy / render_scheduler.num_workers)
+metrics.gauge("render_worker_busy_seconds_total", "Total time render workers spent rendering", lambda: render_scheduler.busy_seconds, kind="counter")
+metrics.gauge("render_watchers", "Clients subscribed to render events", lambda: progress_broker.stats()["subscribers"])
 
 @app.post("/api/render/{video_id}")
-async def render_video(video_id: int, request: RenderRequest, background_tasks: BackgroundTasks):
+async def render_video(video_id: int, request: RenderRequest):
     """Start rendering a video with queue management and UI feedback for empty requests"""
-    video_found = False
-    for video in videos:
-        if video["id"] == video_id:
-            video_found = True
-            break
-            
-    if not video_found:
+    if not videos.exists(video_id):
         raise HTTPException(status_code=404, detail="Video not found")
     
     if video_id not in timelines or not timelines[video_id]["segments"] or all(not s["text"] for s in timelines[video_id]["segments"]):
         raise HTTPException(status_code=400, detail="Timeline is empty or has no text for rendering")
     
-    # Add to render queue
-    queue_item = QueueItem(video_id=video_id, render_request=request)
-    render_queue.append(queue_item)
+    for format in [request.format, *(target.format for target in request.outputs or [])]:
+        if format not in segment_renderer.OUTPUT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported format '{format}', expected one of {', '.join(segment_renderer.OUTPUT_FORMATS)}")
     
-    # Process queue in background
-    background_tasks.add_task(process_render_queue)
-    return {"message": f"Video {video_id} added to render queue (position: {len(render_queue)})"}
+    # Add to render queue, the scheduler workers pick it up; drafts go ahead of previews and finals
+    priority = "draft" if request.quality == "draft" else request.priority
+    job = await render_scheduler.enqueue(video_id, request.dict(), priority)
+    position = render_scheduler.position(video_id)
+    return {
+        "message": f"Video {video_id} added to render queue (position: {position})",
+        "job_id": job["job_id"],
+        "priority": job["priority"],
+        "queue_position": position
+    }
 
 @app.get("/api/render/{video_id}/progress")
 async def get_progress(video_id: int):
     """Get the rendering progress for a video or queue status"""
-    for video in videos:
-        if video["id"] == video_id:
-            return {
-                "status": video["status"],
-                "progress": video["progress"],
-                "queue_position": next((i + 1 for i, item in enumerate(render_queue) if item.video_id == video_id), None)
-            }
+    video = videos.get(video_id)
+    if video:
+        job = render_scheduler.latest_job(video_id)
+        return {
+            "status": video["status"],
+            "progress": video["progress"],
+            "queue_position": render_scheduler.position(video_id),
+            "job_state": job["state"] if job else None
+        }
     raise HTTPException(status_code=404, detail="Video not found")
 
 @app.get("/api/render/queue")
 async def get_render_queue():
     """Get the current render queue"""
-    return {"queue": [{"video_id": item.video_id, "position": i + 1} for i, item in enumerate(render_queue)]}
+    return {
+        "queue": [
+            {"video_id": job["video_id"], "position": i + 1, "priority": job["priority"], "job_id": job["job_id"]}
+            for i, job in enumerate(render_scheduler.queued_jobs())
+        ],
+        **render_scheduler.stats(),
+        "watchers": progress_broker.stats()
+    }
+
+def current_render_state(video_id: int) -> Dict:
+    """Get the state sent to a watcher that subscribes before any event was published"""
+    video = videos.get(video_id)
+    job = render_scheduler.latest_job(video_id)
+    return {
+        "state": job["state"] if job else video["status"],
+        "progress": video["progress"],
+        "queue_position": render_scheduler.position(video_id)
+    }
+
+@app.get("/api/render/{video_id}/events")
+async def stream_render_events(video_id: int):
+    """Push render state, progress and queue position changes as server-sent events"""
+    if not videos.exists(video_id):
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    async def event_stream():
+        async for event in progress_broker.events(video_id, lambda: current_render_state(video_id)):
+            yield progress_events.sse_format(event)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/api/render/{video_id}/ws")
+async def render_events_socket(websocket: WebSocket, video_id: int):
+    """Push the same render events as /events over a WebSocket"""
+    if not videos.exists(video_id):
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    
+    async def push():
+        async for event in progress_broker.events(video_id, lambda: current_render_state(video_id)):
+            await websocket.send_json(event or {"type": "keepalive"})
+    
+    sender = asyncio.create_task(push())
+    try:
+        # Watch for the disconnect so the subscription is dropped right away
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Expose render, queue and generation metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.expose(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/upstream-stats")
+async def get_upstream_stats():
+    """Get latency and connection pool stats for the OpenAI and FAL clients"""
+    return http_clients.get_http_stats()
+
+@app.get("/api/render/cache")
+async def get_render_cache_stats():
+    """Get segment render cache statistics"""
+    return {**render_cache.get_cache_stats(), "tts": tts_cache.get_tts_stats()}
 
 @app.post("/api/clear-queue")
 async def clear_render_queue():
     """Clear the render queue"""
-    global render_queue
-    render_queue = []
-    return {"message": "Render queue cleared"}
+    cleared = await render_scheduler.clear()
+    return {"message": "Render queue cleared", "cleared": cleared}
 
 # Helper function to convert hex color to RGB tuple
 def hex_to_rgb(hex_color):
@@ -893,50 +1016,56 @@ def hex_to_rgb(hex_color):
     hex_color = hex_color.lstrip('#')
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
-# Create a placeholder video for testing
-def create_placeholder_video():
-    if not os.path.exists("assets/videos/placeholder.mp4"):
-        clip = mp.ColorClip(size=(720, 1280), color=(255, 255, 255), duration=5)  # White background for light theme
-        txt_clip = mp.TextClip(
-            "Sample Video", 
-            fontsize=70, 
-            color='black',
-            size=clip.size,
-            method='caption'
-        )
-        txt_clip = txt_clip.set_position('center').set_duration(5)
-        final_clip = mp.CompositeVideoClip([clip, txt_clip])
-        final_clip.write_videofile("assets/videos/placeholder.mp4", fps=30)
-
-# Create sample music tracks
-def create_sample_music():
-    if not os.path.exists("assets/audio/energetic.mp3"):
-        # Generate a 30-second energetic tone as a placeholder
-        silence = mp.AudioClip(lambda t: 0.5 * (1 + 0.5 * mp.cos(2 * 3.14159 * 440 * t)), duration=30, fps=44100)
-        silence.write_audiofile("assets/audio/energetic.mp3", fps=44100)
-    if not os.path.exists("assets/audio/chill.mp3"):
-        # Generate a 30-second chill tone as a placeholder
-        silence = mp.AudioClip(lambda t: 0.3 * (1 + 0.3 * mp.cos(2 * 3.14159 * 220 * t)), duration=30, fps=44100)
-        silence.write_audiofile("assets/audio/chill.mp3", fps=44100)
-    if not os.path.exists("assets/audio/corporate.mp3"):
-        silence = mp.AudioClip(lambda t: 0.4 * (1 + 0.4 * mp.cos(2 * 3.14159 * 330 * t)), duration=30, fps=44100)
-        silence.write_audiofile("assets/audio/corporate.mp3", fps=44100)
-    if not os.path.exists("assets/audio/cinematic.mp3"):
-        silence = mp.AudioClip(lambda t: 0.6 * (1 + 0.6 * mp.cos(2 * 3.14159 * 110 * t)), duration=30, fps=44100)
-        silence.write_audiofile("assets/audio/cinematic.mp3", fps=44100)
-
-# Create sample script templates
-def create_script_templates():
-    with open("templates/templates.json", "w") as f:
-        json.dump(templates, f)
+# Bring video status back in line with the durable render jobs after a restart
+def restore_render_state():
+    for video in videos.all():
+        job = render_scheduler.latest_job(video["id"], include_drafts=False)
+        if job is None:
+            continue
+        if job["state"] in ("queued", "rendering"):
+            videos.update(video["id"], status="rendering", progress=job["progress"])
+        elif job["state"] == "ready":
+            duration = (job["result"] or {}).get("duration", video["duration"])
+            videos.update(video["id"], status="ready", progress=100, duration=duration)
+        elif job["state"] == "error":
+            videos.update(video["id"], status="error", progress=0)
 
 # Create placeholders on startup
 @app.on_event("startup")
 async def startup_event():
+    startup_started_at = time.perf_counter()
+    await http_clients.start()
+    loop = asyncio.get_running_loop()
+    threading.Thread(
+        target=segment_renderer.listen_progress,
+        args=(lambda event: loop.call_soon_threadsafe(dispatch_encoder_progress, event),),
+        name="render-progress",
+        daemon=True
+    ).start()
+    requeued = render_scheduler.start()
+    if requeued:
+        print(f"Requeued {requeued} interrupted render job(s)")
+    print(f"Loaded {timelines.load_all()} saved timeline(s)")
+    restore_render_state()
+    if transcriber.WHISPER_PRELOAD:
+        asyncio.create_task(transcriber.warm_up())
     try:
         load_templates()
-        create_placeholder_video()
-        create_sample_music()
-        create_script_templates()
     except Exception as e:
-        print(f"Could not create placeholders: {e}")
\ No newline at end of file
+        print(f"Could not load templates: {e}")
+    # Only assets missing or damaged since the last boot are (re)created, off the startup path
+    asyncio.create_task(asyncio.to_thread(bootstrap.ensure_assets, bootstrap.default_assets()))
+    startup_stats["startup_seconds"] = round(time.perf_counter() - startup_started_at, 3)
+    print(f"Startup took {startup_stats['import_seconds']}s importing and {startup_stats['startup_seconds']}s starting up")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await timelines.flush()
+    await render_scheduler.stop()
+    await http_clients.close()
+    segment_renderer.shutdown_render_pool()
+    segment_renderer.stop_progress_listener()  # Only once the workers are gone, so their last events are read
+
+startup_stats = {"import_seconds": round(time.perf_counter() - IMPORT_STARTED_AT, 3), "startup_seconds": None}
+metrics.gauge("app_import_seconds", "Time spent importing the API module", lambda: startup_stats["import_seconds"])
+metrics.gauge("app_startup_seconds", "Time spent in the startup handler", lambda: startup_stats["startup_seconds"] or 0.0)
@@ -0,0 +1,147 @@
+import os
+import re
+import uuid
+import subprocess
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response, FileResponse, StreamingResponse
+from segment_renderer import ffmpeg_binary
+
+STREAM_CHUNK_BYTES = 256 * 1024
+PREVIEW_DIR = "assets/audio/previews"
+PREVIEW_SECONDS = 10
+
+RANGE_PATTERN = re.compile(r"(\d*)-(\d*)$")
+
+class RangeNotSatisfiable(Exception):
+    """The Range header is valid but no part of it overlaps the file"""
+
+def file_validators(path: str) -> Tuple[str, str]:
+    """Get the ETag and Last-Modified header values of a file"""
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    return etag, formatdate(stat.st_mtime, usegmt=True)
+
+def opaque_tag(tag: str) -> str:
+    """Strip the weak indicator from an entity tag"""
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weakly compare an If-None-Match value ("*" or a list of tags, weak or strong) with an ETag"""
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or opaque_tag(etag) in [opaque_tag(tag) for tag in tags]
+
+def is_not_modified(request: Request, etag: str, last_modified: str) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against the current validators"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a Range header into an inclusive (start, end), or None to serve the whole file
+
+    Only single byte ranges are served. Other units, malformed headers and
+    multi-range requests are ignored, which RFC 7233 allows; a single range
+    that lies entirely past the end raises RangeNotSatisfiable.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    match = RANGE_PATTERN.match(ranges.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:  # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None  # Syntactically invalid
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+def iter_file_range(path: str, start: int, end: int):
+    """Yield the bytes of a file between start and end (inclusive) in fixed-size chunks"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def ranged_file_response(request: Request, path: str, media_type: str) -> Response:
+    """Serve a file with byte-range (206) and conditional (304) support"""
+    etag, last_modified = file_validators(path)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache"  # Always revalidate; a 304 costs no body
+    }
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(path)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is outdated: send the whole file
+    if range_header and (if_range is None or if_range in (etag, last_modified)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(iter_file_range(path, start, end), status_code=206, media_type=media_type, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+def preview_clip(source: str, seconds: int = PREVIEW_SECONDS) -> str:
+    """Cut the first seconds of an audio file once and reuse the clip until the source changes"""
+    os.makedirs(PREVIEW_DIR, exist_ok=True)
+    stat = os.stat(source)
+    name = os.path.splitext(os.path.basename(source))[0]
+    extension = os.path.splitext(source)[1]
+    path = os.path.join(PREVIEW_DIR, f"{name}_{stat.st_mtime_ns:x}_{stat.st_size:x}_{seconds}s{extension}")
+    if os.path.exists(path):
+        return path
+
+    temp_path = os.path.join(PREVIEW_DIR, f".{uuid.uuid4().hex}{extension}")
+    try:
+        # Stream copy: the clip is cut at frame boundaries without re-encoding
+        result = subprocess.run(
+            [ffmpeg_binary(), "-y", "-loglevel", "error", "-i", source, "-t", str(seconds), "-map", "0:a", "-c", "copy", temp_path],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg preview cut failed: {result.stderr.strip()}")
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    # Drop clips cut from older versions of the same track
+    pattern = re.compile(rf"{re.escape(name)}_[0-9a-f]+_[0-9a-f]+_\d+s{re.escape(extension)}$")
+    for filename in os.listdir(PREVIEW_DIR):
+        stale = os.path.join(PREVIEW_DIR, filename)
+        if pattern.match(filename) and stale != path:
+            os.remove(stale)
+    return path
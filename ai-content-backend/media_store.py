@@ -0,0 +1,52 @@
+import os
+import uuid
+import hashlib
+import asyncio
+from typing import Dict
+from fastapi import UploadFile
+
+UPLOAD_DIR = "assets/videos"
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+
+upload_stats = {"uploads": 0, "deduplicated": 0, "bytes": 0}
+
+def write_chunk(f, digest, chunk: bytes):
+    """Write one chunk and feed it to the running hash"""
+    f.write(chunk)
+    digest.update(chunk)
+
+async def save_upload(file: UploadFile, directory: str = UPLOAD_DIR) -> Dict:
+    """Stream an upload to disk in fixed-size chunks, stored under the sha256 of its content
+
+    Only one chunk is held in memory at a time, and byte-identical uploads
+    resolve to the same file so they are stored once.
+    """
+    extension = os.path.splitext(file.filename or "")[1].lower() or ".mp4"
+    temp_path = os.path.join(directory, f".upload_{uuid.uuid4().hex}{extension}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                await asyncio.to_thread(write_chunk, f, digest, chunk)
+                size += len(chunk)
+        filename = f"{digest.hexdigest()}{extension}"
+        path = os.path.join(directory, filename)
+        deduplicated = os.path.exists(path)
+        if deduplicated:
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    upload_stats["uploads"] += 1
+    upload_stats["bytes"] += size
+    if deduplicated:
+        upload_stats["deduplicated"] += 1
+    return {"path": path, "filename": filename, "sha256": digest.hexdigest(), "size": size, "deduplicated": deduplicated}
+
+def get_upload_stats() -> Dict:
+    """Get upload and deduplication counters"""
+    return {**upload_stats, "chunk_bytes": UPLOAD_CHUNK_BYTES}
@@ -0,0 +1,145 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# Seconds; spans a cached lookup up to a long 1080p render
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+registry = {}  # name -> metric, in registration order
+lock = threading.Lock()
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Format a Prometheus label set"""
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+def format_value(value: float) -> str:
+    """Format a sample value the way Prometheus expects"""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative histogram with a fixed label set"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        """Record one observation"""
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with lock:
+            series = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with lock:
+            series = {key: list(values) for key, values in self.series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, ('le', format_value(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labels, key, ('le', '+Inf'))} {values[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(values[-2])}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {values[-1]}")
+        return lines
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time
+
+    The callback returns a number, or a dict of label value tuples to numbers.
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], Union[float, Dict[Tuple, float]]], labels: Sequence[str] = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.read()
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        for key, sample in samples:
+            lines.append(f"{self.name}{format_labels(self.labels, key)} {format_value(sample)}")
+        return lines
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Register a histogram (or get the one already registered under the name)"""
+    if name not in registry:
+        registry[name] = Histogram(name, help, labels, buckets)
+    return registry[name]
+
+def gauge(name: str, help: str, read: Callable, labels: Sequence[str] = (), kind: str = "gauge") -> Gauge:
+    """Register a scrape-time gauge, replacing any earlier one with the name"""
+    registry[name] = Gauge(name, help, read, labels, kind)
+    return registry[name]
+
+def expose() -> str:
+    """Render every registered metric in the Prometheus text format"""
+    lines = []
+    for metric in list(registry.values()):
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+def segment_bucket(count: int) -> str:
+    """Group segment counts into a few label values to keep cardinality low"""
+    for limit in (5, 10, 20, 50):
+        if count <= limit:
+            return f"<={limit}"
+    return ">50"
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str):
+    """Add the time spent in the block to timings[stage]"""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started_at
+
+@contextmanager
+def observe(hist: Histogram, **labels):
+    """Observe the time spent in the block on a histogram"""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        hist.observe(time.perf_counter() - started_at, **labels)
+
+RENDER_SECONDS = histogram(
+    "render_seconds", "Wall time of a full video render",
+    ["resolution", "editing_style", "segments"]
+)
+RENDER_STAGE_SECONDS = histogram(
+    "render_stage_seconds", "Wall time of each stage of a video render",
+    ["stage", "resolution", "editing_style", "segments"]
+)
+SEGMENT_STAGE_SECONDS = histogram(
+    "render_segment_stage_seconds", "Time spent in each stage of a single segment render (worker time)",
+    ["stage", "resolution", "editing_style"]
+)
+RENDER_QUEUE_WAIT_SECONDS = histogram(
+    "render_queue_wait_seconds", "Time a render job waited in the queue before a worker claimed it",
+    ["priority"]
+)
+GENERATION_SECONDS = histogram(
+    "generation_seconds", "Wall time of script and image generation requests",
+    ["kind", "source"]
+)
@@ -0,0 +1,76 @@
+import json
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Optional
+
+SUBSCRIBER_QUEUE_SIZE = 64
+KEEPALIVE_SECONDS = 15
+
+class ProgressBroker:
+    """Fan render events out to every subscriber of a video from a single publish
+
+    Publishers never wait on subscribers: each subscriber has a bounded queue
+    and a slow one loses its oldest events instead of growing memory. The last
+    event of each type is kept so a new subscriber starts from the current state.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = {}  # video_id -> set of queues
+        self.latest = {}  # video_id -> {event type: last event}
+
+    def publish(self, video_id: int, event: Dict):
+        """Record an event and hand it to the subscribers of its video (call on the event loop)"""
+        event = {"video_id": video_id, **event}
+        self.latest.setdefault(video_id, {})[event["type"]] = event
+        for queue in self.subscribers.get(video_id, ()):
+            if queue.full():
+                queue.get_nowait()  # Progress events are snapshots, so dropping the oldest is safe
+            queue.put_nowait(event)
+
+    def snapshot(self, video_id: int) -> Dict:
+        """Get the last event of each type for a video"""
+        return dict(self.latest.get(video_id, {}))
+
+    def subscribe(self, video_id: int) -> asyncio.Queue:
+        """Register a subscriber queue for a video"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(video_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, video_id: int, queue: asyncio.Queue):
+        """Remove a subscriber queue"""
+        queues = self.subscribers.get(video_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[video_id]
+
+    async def events(self, video_id: int, initial: Optional[Callable[[], Dict]] = None) -> AsyncIterator[Optional[Dict]]:
+        """Yield the current state, then live events; None is yielded when a keepalive is due"""
+        queue = self.subscribe(video_id)
+        try:
+            snapshot = self.snapshot(video_id)
+            if not snapshot and initial:
+                snapshot = {"state": {"video_id": video_id, "type": "state", **initial()}}
+            for event in snapshot.values():
+                yield event
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.unsubscribe(video_id, queue)
+
+    def stats(self) -> Dict:
+        """Get subscriber counts"""
+        return {
+            "videos_watched": len(self.subscribers),
+            "subscribers": sum(len(queues) for queues in self.subscribers.values())
+        }
+
+def sse_format(event: Optional[Dict]) -> str:
+    """Encode an event (or a keepalive for None) as a server-sent event"""
+    if event is None:
+        return ": keepalive\n\n"
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,96 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, List, Optional
+import file_cache
+from segment_renderer import segment_media_path
+
+# Bump when the segment renderer output changes so stale entries are never reused
+CACHE_VERSION = 4
+CACHE_DIR = "rendered/cache"
+CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", 2 * 1024 ** 3))  # 2 GB
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+cache_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+file_hashes = {}  # (path, size, mtime) -> sha256, so unchanged media is hashed once
+cache_lock = threading.Lock()
+
+def file_hash(path: str) -> str:
+    """Get the sha256 of a media file, reusing the last result while the file is unchanged"""
+    stat = os.stat(path)
+    fingerprint = (path, stat.st_size, stat.st_mtime_ns)
+    if fingerprint not in file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        file_hashes[fingerprint] = digest.hexdigest()
+    return file_hashes[fingerprint]
+
+def segment_cache_key(job: Dict) -> str:
+    """Hash everything that affects the rendered output of a segment job"""
+    segment = job["segment"]
+    media_path = segment_media_path(segment)
+    payload = {
+        "version": CACHE_VERSION,
+        "text": segment.get("text", ""),
+        "duration": job["duration"],
+        "mediaType": segment.get("mediaType"),
+        "media": file_hash(media_path) if media_path else None,
+        "background": segment.get("background", "#1e293b"),
+        "captions": job["captions"],
+        "editing_style": job["editing_style"],
+        "zoom": job["zoom"],
+        "quality": job["quality"],  # Drafts differ in frame rate, preset and audio bitrate
+        "size": [job["width"], job["height"]]
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def cache_path(key: str) -> str:
+    """Get the cache file for a segment key"""
+    return f"{CACHE_DIR}/{key}.mp4"
+
+def lookup(key: str) -> Optional[str]:
+    """Return the cached segment file for a key, marking it as recently used
+
+    A hit is pinned until the caller releases it.
+    """
+    path = cache_path(key)
+    with cache_lock:
+        if os.path.exists(path):
+            os.utime(path)  # mtime doubles as the LRU timestamp
+            cache_stats["hits"] += 1
+            return file_cache.pin(path)
+        cache_stats["misses"] += 1
+        return None
+
+def store(key: str, rendered_file: str) -> str:
+    """Move a freshly rendered segment into the cache, pinned until the caller releases it"""
+    path = cache_path(key)
+    with cache_lock:
+        os.replace(rendered_file, path)
+        cache_stats["stores"] += 1
+        return file_cache.pin(path)
+
+def release(paths: List[str]):
+    """Unpin segment files returned by lookup or store"""
+    file_cache.release(paths)
+
+def evict():
+    """Delete least recently used segments not in use until the cache fits in CACHE_MAX_BYTES"""
+    with cache_lock:
+        cache_stats["evictions"] += file_cache.evict_lru(CACHE_DIR, CACHE_MAX_BYTES)
+
+def get_cache_stats():
+    """Get hit/miss counters and the current size of the segment cache"""
+    files = [entry for entry in os.scandir(CACHE_DIR) if entry.is_file()]
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    return {
+        **cache_stats,
+        "hit_rate": cache_stats["hits"] / lookups if lookups else 0.0,
+        "entries": len(files),
+        "size_bytes": sum(entry.stat().st_size for entry in files),
+        "max_bytes": CACHE_MAX_BYTES
+    }
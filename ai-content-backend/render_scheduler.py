@@ -0,0 +1,132 @@
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from render_store import RenderStore, LEASE_SECONDS, worker_owner_id
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 2))
+
+# Lower value is served first; jobs with the same priority are served FIFO
+PRIORITIES = {"draft": -1, "preview": 0, "final": 1}
+# A new request replaces a queued job of the same video only within its group, so drafts never replace finals
+FOLD_GROUPS = {"draft": ("draft",), "preview": ("preview", "final"), "final": ("preview", "final")}
+
+class RenderScheduler:
+    """Fixed pool of render workers claiming jobs from the durable render store"""
+
+    def __init__(self, render_fn: Callable[[Dict], Awaitable[Any]], workers: int = RENDER_WORKERS, store: Optional[RenderStore] = None, on_change: Optional[Callable[[Dict], None]] = None):
+        self.render_fn = render_fn
+        self.on_change = on_change  # Called with the job after every state change
+        self.num_workers = max(1, workers)
+        self.store = store or RenderStore()
+        self.owner = worker_owner_id()
+        self.busy = 0
+        self.busy_seconds = 0.0  # Total time workers spent rendering, for utilization over time
+        self.condition = None
+        self.workers = []
+
+    def notify(self, job: Dict):
+        """Report a job state change to the listener"""
+        if self.on_change:
+            self.on_change(job)
+
+    def start(self) -> int:
+        """Requeue jobs interrupted by a previous run and start the worker tasks"""
+        requeued = self.store.requeue_interrupted()
+        self.condition = asyncio.Condition()
+        self.workers = [asyncio.create_task(self.worker(n)) for n in range(self.num_workers)]
+        return requeued
+
+    async def stop(self):
+        """Cancel the worker tasks; their leases expire and the jobs are requeued on the next start"""
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def enqueue(self, video_id: int, request: Dict, priority: str = "final") -> Dict:
+        """Queue a render, folding it into an already queued job for the same video"""
+        priority = priority if priority in PRIORITIES else "final"
+        job = self.store.enqueue(video_id, request, priority, PRIORITIES[priority], FOLD_GROUPS[priority])
+        self.notify(job)
+        async with self.condition:
+            self.condition.notify()
+        return job
+
+    async def next_job(self) -> Dict:
+        """Wait for the store to hand out a job, sweeping for expired leases while idle"""
+        async with self.condition:
+            while True:
+                job = self.store.claim(self.owner)
+                if job:
+                    return job
+                try:
+                    await asyncio.wait_for(self.condition.wait(), timeout=LEASE_SECONDS)
+                except asyncio.TimeoutError:
+                    self.store.requeue_interrupted()
+
+    async def heartbeat(self, job: Dict):
+        """Keep the lease on a running job alive"""
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            if not self.store.heartbeat(job["job_id"], self.owner):
+                print(f"Lost lease on render job {job['job_id']} for video {job['video_id']}")
+                return
+
+    async def worker(self, n: int):
+        """Render jobs one at a time until cancelled"""
+        while True:
+            job = await self.next_job()
+            self.notify(job)
+            self.busy += 1
+            started_at = time.perf_counter()
+            heartbeat = asyncio.create_task(self.heartbeat(job))
+            try:
+                result = await self.render_fn(job)
+                self.store.finish(job["job_id"], self.owner, "ready", result=result)
+                self.notify({**job, "state": "ready", "progress": 100, "result": result})
+            except asyncio.CancelledError:
+                raise  # Shutdown: leave the lease to expire so the job is requeued
+            except Exception as e:
+                print(f"Render worker {n} failed on video {job['video_id']}: {str(e)}")
+                self.store.finish(job["job_id"], self.owner, "error", error=str(e))
+                self.notify({**job, "state": "error", "progress": 0, "error": str(e)})
+            finally:
+                heartbeat.cancel()
+                self.busy -= 1
+                self.busy_seconds += time.perf_counter() - started_at
+            async with self.condition:
+                self.condition.notify_all()
+
+    async def clear(self) -> int:
+        """Cancel every queued job; running renders are left to finish"""
+        jobs = self.store.queued_jobs()
+        cleared = self.store.clear()
+        for job in jobs:
+            self.notify({**job, "state": "cancelled"})
+        return cleared
+
+    def queued_jobs(self) -> List[Dict]:
+        """Get the queued jobs in the order they will be picked up"""
+        return self.store.queued_jobs()
+
+    def position(self, video_id: int) -> Optional[int]:
+        """Get the 1-based queue position of a video, or None if it is not queued"""
+        return self.store.position(video_id)
+
+    def latest_job(self, video_id: int, include_drafts: bool = True) -> Optional[Dict]:
+        """Get the most recent job for a video"""
+        return self.store.latest_job(video_id, include_drafts)
+
+    def update_progress(self, video_id: int, progress: int):
+        """Persist the progress of a running render"""
+        self.store.update_progress(video_id, progress)
+
+    def stats(self) -> Dict:
+        """Get worker and queue counters"""
+        return {
+            "workers": self.num_workers,
+            "busy_workers": self.busy,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "queued": self.store.count("queued")
+        }
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+RENDER_DB_PATH = os.getenv("RENDER_DB_PATH", "projects/render_jobs.db")
+LEASE_SECONDS = int(os.getenv("RENDER_LEASE_SECONDS", 30))
+MAX_ATTEMPTS = int(os.getenv("RENDER_MAX_ATTEMPTS", 3))
+PROCESS_NONCE = uuid.uuid4().hex[:8]  # Tells this process apart from an earlier one that had the same pid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS render_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT UNIQUE NOT NULL,
+    video_id INTEGER NOT NULL,
+    request TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    queued_at REAL NOT NULL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_render_jobs_pending ON render_jobs (state, rank, queued_at, id);
+CREATE INDEX IF NOT EXISTS idx_render_jobs_video ON render_jobs (video_id, state);
+"""
+
+def worker_owner_id() -> str:
+    """Identify this process as a lease owner (host:pid:nonce)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{PROCESS_NONCE}"
+
+def owner_is_dead(owner: str) -> bool:
+    """Check whether a lease owner was a process on this host that no longer exists"""
+    host, pid, _ = owner.split(":")
+    if host != socket.gethostname():
+        return False  # Only the lease timeout can tell for other hosts
+    if int(pid) == os.getpid():
+        # A restarted container often reuses the pid (typically 1), so only the nonce shows it was another process
+        return owner != worker_owner_id()
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+class RenderStore:
+    """SQLite-backed render job table with lease-based claiming"""
+
+    def __init__(self, path: str = RENDER_DB_PATH):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        # WAL keeps readers off the writer's back; NORMAL sync is durable across app crashes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def transaction(self, fn):
+        """Run fn(conn) inside a write transaction"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self.conn)
+                self.conn.execute("COMMIT")
+                return result
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def to_job(self, row: Optional[sqlite3.Row]) -> Optional[Dict]:
+        """Convert a row to a job dict"""
+        if row is None:
+            return None
+        job = dict(row)
+        job["request"] = json.loads(job["request"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self, video_id: int, request: Dict, priority: str, rank: int, fold_with: Optional[Sequence[str]] = None) -> Dict:
+        """Queue a render, folding it into an already queued job for the same video
+
+        Only queued jobs whose priority is in fold_with (default: the same priority) are folded.
+        """
+        fold_with = list(fold_with or [priority])
+        def insert(conn):
+            now = time.time()
+            row = conn.execute(
+                f"SELECT * FROM render_jobs WHERE video_id = ? AND state = 'queued' AND priority IN ({','.join('?' * len(fold_with))})",
+                (video_id, *fold_with)
+            ).fetchone()
+            if row:
+                # Latest request wins; the job keeps its place unless it is promoted
+                if rank < row["rank"]:
+                    conn.execute(
+                        "UPDATE render_jobs SET request = ?, priority = ?, rank = ?, queued_at = ? WHERE id = ?",
+                        (json.dumps(request), priority, rank, now, row["id"])
+                    )
+                else:
+                    conn.execute("UPDATE render_jobs SET request = ? WHERE id = ?", (json.dumps(request), row["id"]))
+                job_id = row["job_id"]
+            else:
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO render_jobs (job_id, video_id, request, priority, rank, state, queued_at, enqueued_at) "
+                    "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                    (job_id, video_id, json.dumps(request), priority, rank, now, now)
+                )
+            return conn.execute("SELECT * FROM render_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self.to_job(self.transaction(insert))
+
+    def claim(self, owner: str) -> Optional[Dict]:
+        """Lease the next queued job whose video is not already rendering"""
+        def lease(conn):
+            row = conn.execute(
+                "SELECT * FROM render_jobs WHERE state = 'queued' AND video_id NOT IN "
+                "(SELECT video_id FROM render_jobs WHERE state = 'rendering') "
+                "ORDER BY rank, queued_at, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE render_jobs SET state = 'rendering', progress = 0, attempts = attempts + 1, "
+                "started_at = ?, lease_owner = ?, lease_expires = ? WHERE id = ?",
+                (now, owner, now + LEASE_SECONDS, row["id"])
+            )
+            return conn.execute("SELECT * FROM render_jobs WHERE id = ?", (row["id"],)).fetchone()
+        return self.to_job(self.transaction(lease))
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """Extend a job lease; False means the lease was lost to another worker"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE render_jobs SET lease_expires = ? WHERE job_id = ? AND lease_owner = ? AND state = 'rendering'",
+                (time.time() + LEASE_SECONDS, job_id, owner)
+            )
+            return cursor.rowcount > 0
+
+    def update_progress(self, video_id: int, progress: int):
+        """Record the progress of the running job for a video"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE render_jobs SET progress = ? WHERE video_id = ? AND state = 'rendering'",
+                (progress, video_id)
+            )
+
+    def finish(self, job_id: str, owner: str, state: str, result: Any = None, error: Optional[str] = None):
+        """Mark a leased job as ready or failed"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE render_jobs SET state = ?, progress = ?, finished_at = ?, result = ?, error = ?, "
+                "lease_owner = NULL, lease_expires = NULL WHERE job_id = ? AND lease_owner = ?",
+                (state, 100 if state == "ready" else 0, time.time(), json.dumps(result) if result is not None else None, error, job_id, owner)
+            )
+
+    def requeue_interrupted(self) -> int:
+        """Requeue running jobs whose lease expired or whose owner process died"""
+        def requeue(conn):
+            now = time.time()
+            rows = conn.execute("SELECT id, attempts, lease_owner, lease_expires FROM render_jobs WHERE state = 'rendering'").fetchall()
+            interrupted = [row for row in rows if row["lease_expires"] < now or owner_is_dead(row["lease_owner"])]
+            for row in interrupted:
+                if row["attempts"] >= MAX_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE render_jobs SET state = 'error', error = 'Render interrupted too many times', "
+                        "finished_at = ?, lease_owner = NULL, lease_expires = NULL WHERE id = ?",
+                        (now, row["id"])
+                    )
+                else:
+                    # Requeued jobs keep their original place in line
+                    conn.execute(
+                        "UPDATE render_jobs SET state = 'queued', progress = 0, lease_owner = NULL, lease_expires = NULL WHERE id = ?",
+                        (row["id"],)
+                    )
+            return len(interrupted)
+        return self.transaction(requeue)
+
+    def clear(self) -> int:
+        """Cancel every queued job"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE render_jobs SET state = 'cancelled', finished_at = ? WHERE state = 'queued'", (time.time(),)
+            )
+            return cursor.rowcount
+
+    def queued_jobs(self) -> List[Dict]:
+        """Get the queued jobs in the order they will be picked up"""
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM render_jobs WHERE state = 'queued' ORDER BY rank, queued_at, id").fetchall()
+        return [self.to_job(row) for row in rows]
+
+    def position(self, video_id: int) -> Optional[int]:
+        """Get the 1-based queue position of a video, or None if it is not queued"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT rank, queued_at, id FROM render_jobs WHERE video_id = ? AND state = 'queued' ORDER BY rank, queued_at, id LIMIT 1",
+                (video_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            ahead = self.conn.execute(
+                "SELECT COUNT(*) FROM render_jobs WHERE state = 'queued' AND (rank, queued_at, id) < (?, ?, ?)",
+                (row["rank"], row["queued_at"], row["id"])
+            ).fetchone()[0]
+        return ahead + 1
+
+    def latest_job(self, video_id: int, include_drafts: bool = True) -> Optional[Dict]:
+        """Get the most recent job for a video"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM render_jobs WHERE video_id = ? AND (? OR priority != 'draft') ORDER BY id DESC LIMIT 1",
+                (video_id, include_drafts)
+            ).fetchone()
+        return self.to_job(row)
+
+    def count(self, state: str) -> int:
+        """Count jobs in a state"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM render_jobs WHERE state = ?", (state,)).fetchone()[0]
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
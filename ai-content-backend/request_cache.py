@@ -0,0 +1,103 @@
+"""Cached, single-flight upstream requests
+
+Used by the image generator (with its on-disk cache) and the script generator
+(with a MemoryCache). A result is read from the cache when possible. Otherwise
+one task per key calls the upstream API and stores the result, and every
+caller awaits that task through a shield. A caller that is cancelled (say, its
+client disconnected) stops waiting, but the call carries on for everyone else
+and still fills the cache. Caches backed by files pass offload so their reads
+and writes run in a worker thread instead of on the event loop.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+import metrics
+
+class MemoryCache:
+    """In-memory LRU whose entries also expire ttl seconds after they were stored"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored_at, value), least recently used first
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a live entry, marking it as recently used"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> int:
+        """Store an entry and evict down to max_entries; returns the number of entries evicted"""
+        self.entries[key] = (time.monotonic(), value)
+        self.entries.move_to_end(key)
+        evicted = 0
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+class RequestCache:
+    """Coalesce identical upstream requests and cache their results"""
+
+    def __init__(self, kind: str, read: Callable[[str], Optional[Any]], write: Callable[[str, Any], None], offload: bool = False):
+        self.kind = kind  # GENERATION_SECONDS label
+        self.read = read
+        self.write = write
+        self.offload = offload  # Run read and write with asyncio.to_thread
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+        self.inflight: Dict[str, asyncio.Task] = {}  # cache key -> task producing it
+
+    async def call(self, function: Callable, *args) -> Any:
+        """Run a cache read or write, in a worker thread when offloading"""
+        if self.offload:
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+
+    async def produce(self, key: str, request: Callable[[], Awaitable[Any]], source: str) -> Any:
+        """Call upstream and cache the result"""
+        with metrics.observe(metrics.GENERATION_SECONDS, kind=self.kind, source=source):
+            result = await request()
+        await self.call(self.write, key, result)
+        return result
+
+    def forget(self, key: str, task: asyncio.Task):
+        """Drop a finished task from the in-flight map"""
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller stopped waiting
+
+    async def get(self, key: str, request: Callable[[], Awaitable[Any]], source: str, force: bool = False) -> Any:
+        """Get the result for a key from the cache, an identical in-flight request, or request()
+
+        Forced calls skip the cache and neither join nor are joined by other callers mid-flight.
+        """
+        if not force:
+            started_at = time.perf_counter()
+            cached = await self.call(self.read, key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                metrics.GENERATION_SECONDS.observe(time.perf_counter() - started_at, kind=self.kind, source="cache")
+                return cached
+            if key in self.inflight:
+                self.stats["coalesced"] += 1
+                with metrics.observe(metrics.GENERATION_SECONDS, kind=self.kind, source="coalesced"):
+                    return await asyncio.shield(self.inflight[key])
+        self.stats["misses"] += 1
+
+        task = asyncio.ensure_future(self.produce(key, request, source))
+        if not force:
+            self.inflight[key] = task
+        task.add_done_callback(lambda done: self.forget(key, done))
+        return await asyncio.shield(task)
@@ -1,167 +1,198 @@
+"""Script generation engine
+
+Shared by the single and batch script endpoints: a request is resolved against
+its template, turned into a chat completion request, and the reply is parsed
+into timeline segments. Completions are cached in memory by their normalized
+prompt, template, model and temperature, and identical requests in flight at
+the same time share one OpenAI call (see request_cache).
+"""
 from fastapi import HTTPException
-import httpx
+import http_clients
+import hashlib
 import json
-import re
-from typing import List, Dict
 import os
+import re
+import uuid
+from typing import Dict, List, Optional
+from request_cache import MemoryCache, RequestCache
 
-# In-memory storage (shared with main.py)
-script_templates = [
-    {
-        "id": "problem-solution",
-        "name": "Problem-Solution",
-        "description": "Introduces a problem and presents your product/service as the solution",
-        "structure": [
-            {"type": "intro", "purpose": "Introduce the problem briefly (1 sentence)"},
-            {"type": "point", "purpose": "Explain the issue briefly (1 sentence)"},
-            {"type": "point", "purpose": "Introduce solution briefly (1 sentence)"},
-            {"type": "point", "purpose": "Show benefits briefly (1 sentence)"},
-            {"type": "conclusion", "purpose": "Call to action (1 sentence)"}
-        ]
-    },
-    {
-        "id": "how-to",
-        "name": "How-To Tutorial",
-        "description": "Step-by-step instructions to accomplish a specific task",
-        "structure": [
-            {"type": "intro", "purpose": "Introduce what viewers will learn briefly (1 sentence)"},
-            {"type": "point", "purpose": "Step 1 briefly (1 sentence)"},
-            {"type": "point", "purpose": "Step 2 briefly (1 sentence)"},
-            {"type": "point", "purpose": "Step 3 briefly (1 sentence)"},
-            {"type": "conclusion", "purpose": "Recap and benefits briefly (1 sentence)"}
-        ]
-    },
-    {
-        "id": "listicle",
-        "name": "Listicle (Top 5)",
-        "description": "Presents a list of tips, ideas, or products",
-        "structure": [
-            {"type": "intro", "purpose": "Introduce the topic briefly (1 sentence)"},
-            {"type": "point", "purpose": "Item #1 briefly (1 sentence)"},
-            {"type": "point", "purpose": "Item #2 briefly (1 sentence)"},
-            {"type": "point", "purpose": "Item #3 briefly (1 sentence)"},
-            {"type": "point", "purpose": "Item #4 briefly (1 sentence)"},
-            {"type": "point", "purpose": "Item #5 briefly (1 sentence)"},
-            {"type": "conclusion", "purpose": "Summarize and call to action briefly (1 sentence)"}
-        ]
-    }
-]
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-async def generate_script_task(video_id: int, request: Dict):
-    """Generate script content for timeline segments using OpenAI or trends"""
-    global script_templates
-    template = None
-    if request.get("selected_template"):
-        for t in script_templates:
-            if t["id"] == request["selected_template"]:
-                template = t
-                break
-    
-    segment_structure = request.get("segmentTypes", [])
-    if template:
+SCRIPT_MODEL = os.getenv("SCRIPT_MODEL", "gpt-4")
+SCRIPT_TEMPERATURE = 0.7
+SCRIPT_MAX_TOKENS = 1000
+SCRIPT_CACHE_SIZE = int(os.getenv("SCRIPT_CACHE_SIZE", 512))  # Completions kept in memory
+SCRIPT_CACHE_TTL = int(os.getenv("SCRIPT_CACHE_TTL", 24 * 3600))  # Trends move on, so completions expire
+
+completions = MemoryCache(SCRIPT_CACHE_SIZE, SCRIPT_CACHE_TTL)
+
+def find_template(template_id: Optional[str], templates: List[Dict]) -> Optional[Dict]:
+    """Look up a template by id"""
+    if not template_id:
+        return None
+    return next((t for t in templates if t["id"] == template_id), None)
+
+def plan_script(request: Dict, template: Optional[Dict]) -> Dict:
+    """Work out the segment types, slide duration and word limit for a request"""
+    if not template:
+        segment_structure = list(request.get("segmentTypes") or [])
+        slide_duration = request.get("slide_duration") or 3
+        max_words = request.get("max_words_per_segment") or 8
+    else:
         segment_structure = [s["type"] for s in template["structure"]]
-    
+        slide_duration = template["slide_duration"]
+        max_words = template["max_words_per_segment"]
+
+    # Enforce 2-4 seconds per slide and word limit
+    slide_duration = max(2, min(4, slide_duration))
+    max_words = max(0, max_words)  # Allow 0 for silent videos
+
+    # Calculate number of segments based on target duration (if provided)
     num_segments = len(segment_structure)
     if request.get("target_duration"):
-        avg_duration = max(2, min(4, request["target_duration"] // num_segments))  # Ensure 2-4s per segment
-        num_segments = max(1, request["target_duration"] // 4)  # Minimum 1 segment, max ~4s each
+        num_segments = max(1, request["target_duration"] // slide_duration)  # Minimum 1 segment
         if num_segments < len(segment_structure):
             segment_structure = segment_structure[:num_segments]
         elif num_segments > len(segment_structure):
-            segment_structure.extend([segment_structure[-1]] * (num_segments - len(segment_structure)))
+            segment_structure.extend([segment_structure[-1] if segment_structure else "Point"] * (num_segments - len(segment_structure)))
+
+    return {
+        "segment_structure": segment_structure,
+        "num_segments": num_segments,
+        "slide_duration": slide_duration,
+        "max_words": max_words,
+        "captions": template["captions"] if template else False
+    }
 
+def build_messages(request: Dict, plan: Dict) -> List[Dict]:
+    """Build the chat messages asking for a script"""
+    slide_duration, max_words = plan["slide_duration"], plan["max_words"]
     prompt = f"""
     Create a script for a short-form video about {request['title']}.
-    
+
     Topic: {request['topic']}
     Goal: {request['goal']}
     Target Audience: {request['target_audience']}
-    Tone: {request.get('tone', 'informative')}
+    Tone: {request.get('tone') or 'informative'}
     """
-    
-    if request.get("use_trends", False):
+
+    if request.get("use_trends"):
         prompt += """
         Use current AI trends from YouTube and TikTok (e.g., AI tools, ethics, education) to generate relevant, engaging content.
         """
     else:
         prompt += f"""
-        The script should be divided into {num_segments} segments, each lasting approximately {avg_duration} seconds.
+        The script should be divided into {plan['num_segments']} segments, each lasting approximately {slide_duration} seconds.
         Each segment should have:
-        1. Script text (1 concise sentence, under 15 words, conversational, and engaging)
+        1. Script text ({max_words} words maximum, conversational, and engaging, or no text if max_words is 0)
         2. Visual description (what should appear on screen, detailed but brief, for images or videos)
-        
+
         Format your response as a JSON array with each segment having:
-        - text: The script to be read (1 sentence, max 15 words)
+        - type: The segment type (e.g., Hook, Intro, Point, Conclusion)
+        - text: The script to be read (1 sentence, max {max_words} words, or empty if max_words is 0)
         - visualPrompt: Description of what should be shown visually (brief, actionable)
-        
+
         Keep the pacing fast to maintain viewer retention for a short-form video.
         """
-    
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gpt-4",
-                "messages": [
-                    {"role": "system", "content": "You are an expert scriptwriter for short-form videos, focusing on 2-4 second segments with one sentence per slide (max 15 words), using AI trends if specified."},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 1000
-            }
-        )
-        
-        if response.status_code != 200:
-            print("OpenAI Error:", response.text)
-            raise HTTPException(status_code=500, detail=f"OpenAI API error: {response.text}")
-        
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
-        
-        json_match = re.search(r'\[.*\]', content, re.DOTALL)
+
+    return [
+        {"role": "system", "content": f"You are an expert scriptwriter for short-form videos, focusing on {slide_duration}-second segments with one sentence per slide (max {max_words} words, or no text if 0), using AI trends if specified."},
+        {"role": "user", "content": prompt}
+    ]
+
+def completion_cache_key(payload: Dict, template_id: Optional[str]) -> str:
+    """Hash a completion payload and template, ignoring case and whitespace differences in the prompt"""
+    normalized = {
+        **payload,
+        "messages": [{**m, "content": " ".join(m["content"].lower().split())} for m in payload["messages"]],
+        "template": template_id
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+def cache_completion(key: str, content: str):
+    """Store a completion and evict down to SCRIPT_CACHE_SIZE entries"""
+    script_cache_stats["evictions"] += completions.set(key, content)
+
+script_cache = RequestCache("script", completions.get, cache_completion)
+script_cache_stats = script_cache.stats
+
+async def request_completion(payload: Dict) -> str:
+    """Call OpenAI and return the reply text"""
+    response = await http_clients.post("openai", "/chat/completions", json=payload)
+
+    if response.status_code != 200:
+        print("OpenAI Error:", response.text)
+        raise HTTPException(status_code=500, detail=f"OpenAI API error: {response.text}")
+
+    result = response.json()
+    return result["choices"][0]["message"]["content"]
+
+async def complete(messages: List[Dict], template_id: Optional[str] = None, source: str = "openai", force: bool = False) -> str:
+    """Get a completion from the cache, an identical in-flight request, or OpenAI"""
+    payload = {"model": SCRIPT_MODEL, "messages": messages, "temperature": SCRIPT_TEMPERATURE, "max_tokens": SCRIPT_MAX_TOKENS}
+    return await script_cache.get(completion_cache_key(payload, template_id), lambda: request_completion(payload), source, force)
+
+def assign_segment_ids(segments: List[Dict]) -> bool:
+    """Give every segment without an id a unique one; returns whether any changed"""
+    changed = False
+    for index, segment in enumerate(segments):
+        if not segment.get("id"):
+            segment["id"] = f"segment_{index}_{uuid.uuid4().hex[:8]}"
+            changed = True
+    return changed
+
+def parse_segments(content: str, plan: Dict) -> List[Dict]:
+    """Parse the reply into exactly one segment per planned slot, trimmed to the word limit"""
+    json_match = re.search(r'\[.*\]', content, re.DOTALL)
+    if json_match:
+        json_content = json_match.group(0)
+    else:
+        json_match = re.search(r'\{.*\}', content, re.DOTALL)
         if json_match:
             json_content = json_match.group(0)
         else:
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                json_content = json_match.group(0)
-            else:
-                raise HTTPException(status_code=500, detail="Failed to parse JSON from OpenAI response")
-        
-        try:
-            segments = json.loads(json_content)
-            if isinstance(segments, dict) and "segments" in segments:
-                segments = segments["segments"]
-            
-            if len(segments) < len(segment_structure):
-                while len(segments) < len(segment_structure):
-                    segments.append({
-                        "text": "Brief additional content here.",
-                        "visualPrompt": "Generic visual related to the topic"
-                    })
-            segments = segments[:len(segment_structure)]
-            
-            # Validate text length (max 15 words per segment)
-            for segment in segments:
-                words = segment["text"].split()
-                if len(words) > 15:
-                    segment["text"] = " ".join(words[:15]) + "..."  # Truncate to 15 words
-            
-            # Save to timelines
-            import main  # Import main to access global timelines
-            main.timelines[video_id] = {"segments": segments}
-            with open(f"projects/timeline_{video_id}.json", "w") as f:
-                json.dump({"segments": segments}, f)
-            
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail="Failed to decode JSON from OpenAI response")
-
-def get_script_templates():
-    """Get all script templates"""
-    return script_templates
\ No newline at end of file
+            raise HTTPException(status_code=500, detail="Failed to parse JSON from OpenAI response")
+
+    try:
+        segments = json.loads(json_content)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=500, detail="Failed to decode JSON from OpenAI response")
+    if isinstance(segments, dict) and "segments" in segments:
+        segments = segments["segments"]
+
+    segment_structure = plan["segment_structure"]
+    segments = segments[:len(segment_structure)]
+    while len(segments) < len(segment_structure):
+        segments.append({
+            "type": segment_structure[len(segments)],
+            "text": "",
+            "visualPrompt": "Generic visual related to the topic"
+        })
+
+    # Validate text length and duration
+    max_words = plan["max_words"]
+    for segment in segments:
+        segment.setdefault("text", "")
+        words = segment["text"].split()
+        if len(words) > max_words and max_words > 0:
+            segment["text"] = " ".join(words[:max_words]) + "..."  # Truncate to max_words
+        segment["duration"] = plan["slide_duration"]
+        segment["captions"] = plan["captions"]
+    assign_segment_ids(segments)
+    return segments
+
+async def generate_script(request: Dict, templates: List[Dict], force: bool = False) -> List[Dict]:
+    """Generate the timeline segments for a script request, reusing cached completions unless forced"""
+    template = find_template(request.get("selected_template"), templates)
+    plan = plan_script(request, template)
+    messages = build_messages(request, plan)
+    content = await complete(messages, template["id"] if template else None, "trends" if request.get("use_trends") else "openai", force)
+    return parse_segments(content, plan)
+
+def get_script_cache_stats():
+    """Get hit/miss counters and the current size of the completion cache"""
+    return {
+        **script_cache_stats,
+        "in_flight": len(script_cache.inflight),
+        "entries": len(completions),
+        "max_entries": SCRIPT_CACHE_SIZE,
+        "ttl_seconds": SCRIPT_CACHE_TTL
+    }
@@ -0,0 +1,475 @@
+import os
+import re
+import time
+import tempfile
+import subprocess
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty
+from typing import Callable, Dict, List, Optional, Tuple
+from utils import hex_to_rgb
+from metrics import timed
+from caption_raster import caption_clip, save_caption
+from zoom_effect import ken_burns, zoom_settings, zoompan_filter
+
+# Number of worker processes used for per-segment rendering
+RENDER_PROCESSES = int(os.getenv("RENDER_PROCESSES", os.cpu_count() or 1))
+SEGMENT_DIR = "rendered/segments"
+VIDEO_FPS = 30
+AUDIO_FPS = 44100
+CAPTION_BOTTOM_PADDING = 50
+DEFAULT_BACKGROUND = "#1e293b"
+HEX_COLOR = re.compile(r"^#?[0-9a-fA-F]{6}$")
+# Encode still segments directly with ffmpeg instead of compositing every frame in moviepy
+STATIC_FAST_PATH = os.getenv("STATIC_FAST_PATH", "1") != "0"
+STATIC_PRESET = "veryfast"  # Stills have no motion to search, so a fast preset costs almost no quality
+DEFAULT_VOICE = {"lang": "en", "tld": "us", "voice": None, "slow": False}
+PROGRESS_INTERVAL = 0.5  # Minimum seconds between encoder progress reports per segment
+# Draft renders are quick pacing checks: small, choppy and cheap to encode
+DRAFT_RESOLUTION = "360p"
+DRAFT_FPS = 15
+DRAFT_PRESET = "ultrafast"
+DRAFT_AUDIO_BITRATE = "64k"
+DERIVE_PRESET = "veryfast"  # Derived outputs re-encode the whole video, so favour speed as the still path does
+# Encoder arguments per output container; anything else gets H.264 with the master's AAC audio copied
+OUTPUT_CODECS = {
+    "webm": ["-c:v", "libvpx-vp9", "-b:v", "0", "-crf", "32", "-row-mt", "1", "-c:a", "libopus"]
+}
+OUTPUT_FORMATS = ["mp4", *OUTPUT_CODECS]
+
+render_pool = None  # Created lazily, shut down on app shutdown
+progress_queue = None  # Encoder progress from the workers (and the API process) to the API process
+progress_listening = None  # Set while listen_progress runs; without a reader, progress is not reported
+progress_lock = threading.Lock()  # The listener thread and the first render may ask for the queue at once
+
+def get_progress_queue():
+    """Get the queue that carries encoder progress out of the render workers"""
+    global progress_queue, progress_listening
+    with progress_lock:
+        if progress_queue is None:
+            context = multiprocessing.get_context("spawn")
+            progress_queue = context.Queue()
+            progress_listening = context.Event()
+    return progress_queue
+
+def init_worker(queue, listening):
+    """Process pool initializer: hand the progress queue to the worker"""
+    global progress_queue, progress_listening
+    progress_queue = queue
+    progress_listening = listening
+
+def get_render_pool():
+    """Get the shared process pool used for segment rendering"""
+    global render_pool
+    if render_pool is None:
+        # Spawn keeps the workers free of the event loop and uvicorn state
+        render_pool = ProcessPoolExecutor(
+            max_workers=RENDER_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(get_progress_queue(), progress_listening)
+        )
+    return render_pool
+
+def warm_worker() -> int:
+    """Import the render stack in a pool worker; returns its pid"""
+    import moviepy.editor  # noqa: F401
+    time.sleep(0.2)  # Stay busy so the other warm-up tasks go to the other workers
+    return os.getpid()
+
+def prewarm_render_pool():
+    """Start every render worker and import the render stack in each, so the first render doesn't pay for it"""
+    pool = get_render_pool()
+    for future in [pool.submit(warm_worker) for _ in range(RENDER_PROCESSES)]:
+        future.result()
+
+def drain_progress(stop: threading.Event):
+    """Discard queued progress until stop is set"""
+    while not stop.is_set():
+        try:
+            progress_queue.get(timeout=0.1)
+        except Empty:
+            pass
+
+def shutdown_render_pool():
+    """Shut down the segment render pool"""
+    global render_pool
+    if render_pool is not None:
+        # An exiting worker waits until its queued progress is flushed to the pipe;
+        # with nobody listening, read it here so a full pipe cannot block the shutdown
+        stop = threading.Event()
+        drain = None
+        if not progress_listening.is_set():
+            drain = threading.Thread(target=drain_progress, args=(stop,), daemon=True)
+            drain.start()
+        try:
+            render_pool.shutdown(cancel_futures=True)
+        finally:
+            stop.set()
+            if drain:
+                drain.join()
+        render_pool = None
+
+def listen_progress(callback):
+    """Pass encoder progress events to callback until stop_progress_listener is called (run in a thread)"""
+    queue = get_progress_queue()
+    progress_listening.set()
+    try:
+        while (event := queue.get()) is not None:
+            callback(event)
+    finally:
+        progress_listening.clear()
+
+def stop_progress_listener():
+    """Wake the progress listener thread and make it return"""
+    if progress_queue is not None:
+        progress_queue.put(None)
+
+def report_progress(job: Dict, frame: int, frames: int):
+    """Send the encoder position of a segment to the API process"""
+    if progress_queue is not None and progress_listening.is_set():
+        progress_queue.put({"video_id": job["video_id"], "index": job["index"], "frame": min(frame, frames), "frames": frames})
+
+def frame_progress_logger(job: Dict):
+    """Build a moviepy logger that reports the frame counter of write_videofile, throttled to PROGRESS_INTERVAL"""
+    from proglog import ProgressBarLogger
+
+    class FrameProgressLogger(ProgressBarLogger):
+        def __init__(self):
+            super().__init__()
+            self.frames = int(job["duration"] * job["fps"])
+            self.reported_at = 0.0
+
+        def bars_callback(self, bar, attr, value, old_value=None):
+            if bar != "t" or attr != "index":
+                return
+            now = time.monotonic()
+            if now - self.reported_at >= PROGRESS_INTERVAL or value + 1 >= self.frames:
+                self.reported_at = now
+                report_progress(job, value + 1, self.frames)
+
+    return FrameProgressLogger()
+
+def ffmpeg_binary() -> str:
+    """Get the ffmpeg executable moviepy is configured with"""
+    from moviepy.config import get_setting  # Resolving the binary is slow, so only on first use
+    return get_setting("FFMPEG_BINARY")
+
+def run_ffmpeg(cmd: List[str], on_progress: Optional[Callable[[Dict], None]] = None, label: str = "ffmpeg"):
+    """Run ffmpeg, passing each block of its -progress output to on_progress"""
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    with tempfile.TemporaryFile(mode="w+") as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        block = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            block[key] = value
+            if key == "progress":
+                if on_progress:
+                    on_progress(block)
+                block = {}
+        if process.wait() != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"{label} failed: {stderr.read().strip()}")
+
+def get_render_dimensions(resolution: str, aspect_ratio: str):
+    """Get the (width, height) of the output frame"""
+    if resolution == "360p":
+        return (360, 640) if aspect_ratio == "9:16" else (640, 360)
+    if aspect_ratio == "9:16":
+        return (720, 1280) if resolution == "1080p" else (576, 1024)  # Portrait
+    return (1280, 720) if resolution == "1080p" else (1024, 576)  # Landscape
+
+def segment_duration(segment: Dict) -> int:
+    """Get the on-screen duration of a segment"""
+    return max(2, min(4, segment.get("duration", 3)))  # Enforce 2-4 seconds
+
+def background_color(segment: Dict) -> str:
+    """Get a segment's background as six hex digits, falling back to the default for anything else
+
+    The value ends up inside an ffmpeg filtergraph, so it must never carry more than a color.
+    """
+    background = segment.get("background")
+    if not isinstance(background, str) or not HEX_COLOR.fullmatch(background):
+        background = DEFAULT_BACKGROUND
+    return background.lstrip("#")
+
+def segment_media_path(segment: Dict) -> Optional[str]:
+    """Get the local video or image file used by a segment, if it exists"""
+    if segment.get("mediaType") == "video" and segment.get("videoUrl"):
+        path = f"assets/videos/{os.path.basename(segment['videoUrl'])}"
+    elif segment.get("mediaType") == "image" and segment.get("imageUrl"):
+        path = f"assets/images/{os.path.basename(segment['imageUrl'])}"
+    else:
+        return None
+    return path if os.path.exists(path) else None
+
+def fit_to_frame(clip, width: int, height: int):
+    """Scale a clip to cover the frame and crop the overflow around the center"""
+    scale = max(width / clip.w, height / clip.h)
+    clip = clip.resize(scale)
+    return clip.crop(x_center=clip.w / 2, y_center=clip.h / 2, width=width, height=height)
+
+def is_static_segment(job: Dict) -> bool:
+    """Check whether a segment's source is a still frame that ffmpeg can encode directly (zoomed or not)"""
+    if not STATIC_FAST_PATH:
+        return False
+    # Missing video files fall back to a color frame, which is static
+    return job["segment"].get("mediaType") != "video" or segment_media_path(job["segment"]) is None
+
+def build_segment_clip(job: Dict, timings: Optional[Dict[str, float]] = None):
+    """Build the moviepy clip for a single segment job, adding stage times to timings"""
+    import moviepy.editor as mp  # Only needed on the render path, so the API starts without it
+    timings = {} if timings is None else timings
+    segment = job["segment"]
+    width, height = job["width"], job["height"]
+    duration = job["duration"]
+    background = hex_to_rgb(background_color(segment))
+
+    # Use custom video, image, or color based on mediaType
+    media_path = segment_media_path(segment)
+    with timed(timings, "media"):
+        if media_path and segment.get("mediaType") == "video":
+            clip = mp.VideoFileClip(media_path, audio=False)
+            clip = fit_to_frame(clip.subclip(0, min(duration, clip.duration)), width, height)
+            clip = clip.set_duration(duration)
+        elif media_path:
+            clip = fit_to_frame(mp.ImageClip(media_path, duration=duration), width, height)
+        else:
+            clip = mp.ColorClip(size=(width, height), color=background, duration=duration)
+
+    if job["zoom"]:
+        # Zoom before captions are added so they stay put; the crop keeps the frame size constant for concat
+        with timed(timings, "effects"):
+            clip = ken_burns(clip, job["zoom"], duration)
+
+    # Add captions if enabled
+    if job["captions"] and segment["text"] and segment["text"].strip():
+        with timed(timings, "caption"):
+            txt_clip = caption_clip(segment["text"], width)
+            txt_clip = txt_clip.set_position(('center', height - CAPTION_BOTTOM_PADDING - txt_clip.h))
+            txt_clip = txt_clip.set_duration(duration)
+            clip = mp.CompositeVideoClip([clip, txt_clip])
+
+    with timed(timings, "effects"):
+        if job["editing_style"] == "fade":
+            clip = clip.fx(mp.vfx.fadein, 0.5).fx(mp.vfx.fadeout, 0.5)
+
+    # Segments are video only; the soundtrack is mixed once for the whole video (see audio_mix)
+    return clip.set_duration(duration)
+
+def render_static_segment(job: Dict, timings: Optional[Dict[str, float]] = None) -> str:
+    """Encode a still segment straight from its image or color with ffmpeg, skipping the moviepy frame loop"""
+    timings = {} if timings is None else timings
+    segment = job["segment"]
+    width, height = job["width"], job["height"]
+    duration = job["duration"]
+    fps = job["fps"]
+    frames = int(duration * fps)
+    inputs = []
+    filters = []
+
+    media_path = segment_media_path(segment)
+    if media_path:
+        # Decode and scale the image once, then repeat that single frame (or zoom into it)
+        inputs += ["-i", media_path]
+        if job["zoom"]:
+            motion = zoompan_filter(job["zoom"], width, height, frames, fps)
+        else:
+            motion = f"loop=loop={frames - 1}:size=1:start=0,setpts=N/{fps}/TB"
+        filters.append(
+            f"[0:v]scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},{motion},setsar=1[base]"
+        )
+    else:
+        # A zoom into a flat color looks exactly like the color itself
+        color = background_color(segment)
+        inputs += ["-f", "lavfi", "-i", f"color=c=0x{color}:s={width}x{height}:r={fps}:d={duration}"]
+        filters.append("[0:v]setsar=1[base]")
+    video = "[base]"
+
+    caption_file = None
+    if job["captions"] and segment["text"] and segment["text"].strip():
+        # The caption is rasterized once; overlay repeats its single frame over the whole segment
+        caption_file = f"{job['output']}.caption.png"
+        with timed(timings, "caption"):
+            save_caption(segment["text"], width, caption_file)
+        inputs += ["-i", caption_file]
+        filters.append(f"{video}[1:v]overlay=(W-w)/2:H-h-{CAPTION_BOTTOM_PADDING}[captioned]")
+        video = "[captioned]"
+
+    if job["editing_style"] == "fade":
+        filters.append(f"{video}fade=t=in:st=0:d=0.5,fade=t=out:st={duration - 0.5}:d=0.5[faded]")
+        video = "[faded]"
+    filters.append(f"{video}format=yuv420p[vout]")
+
+    cmd = [
+        ffmpeg_binary(), "-y", "-loglevel", "error", *inputs,
+        "-filter_complex", ";".join(filters),
+        "-map", "[vout]", "-an",
+        "-c:v", "libx264", "-preset", job["preset"] or STATIC_PRESET, *([] if job["zoom"] else ["-tune", "stillimage"]), "-r", str(fps),
+        "-t", str(duration), job["output"]
+    ]
+    def on_progress(block):
+        if block.get("frame", "").isdigit():
+            report_progress(job, int(block["frame"]), frames)
+
+    try:
+        # Decoding, scaling, effects and encoding all happen inside this one ffmpeg run
+        with timed(timings, "encode"):
+            run_ffmpeg(cmd, on_progress, "ffmpeg still segment")
+    finally:
+        if caption_file and os.path.exists(caption_file):
+            os.remove(caption_file)
+    return job["output"]
+
+def render_segment(job: Dict) -> Dict:
+    """Render a single segment to an intermediate file (runs in a worker process)
+
+    Returns the output path and the seconds spent in each stage.
+    """
+    timings = {}
+    if is_static_segment(job):
+        render_static_segment(job, timings)
+        return {"output": job["output"], "timings": timings}
+    clip = build_segment_clip(job, timings)
+    try:
+        # moviepy applies resizing, compositing and effects frame by frame while writing
+        with timed(timings, "encode"):
+            clip.write_videofile(
+                job["output"],
+                fps=job["fps"],
+                codec='libx264',
+                preset=job["preset"] or "medium",
+                audio=False,
+                threads=1,
+                logger=frame_progress_logger(job)
+            )
+    finally:
+        clip.close()
+    return {"output": job["output"], "timings": timings}
+
+def segment_dir_for(video_id: int, quality: str = "final") -> str:
+    """Get the intermediate segment directory of a render, kept apart for drafts and finals"""
+    return f"{SEGMENT_DIR}/{video_id}_draft" if quality == "draft" else f"{SEGMENT_DIR}/{video_id}"
+
+def build_segment_jobs(video_id: int, segments: List[Dict], resolution: str, editing_style: str, captions: bool, aspect_ratio: str, quality: str = "final", size: Optional[Tuple[int, int]] = None) -> List[Dict]:
+    """Turn timeline segments into self-contained, picklable render jobs
+
+    size overrides the frame size, e.g. with the master frame of a multi-output render.
+    """
+    draft = quality == "draft"
+    if draft:
+        resolution, editing_style = DRAFT_RESOLUTION, "standard"  # Zoom and fades are skipped in drafts
+    width, height = size or get_render_dimensions(resolution, aspect_ratio)
+    segment_dir = segment_dir_for(video_id, quality)
+    os.makedirs(segment_dir, exist_ok=True)
+    return [
+        {
+            "index": idx,
+            "video_id": video_id,
+            "segment": segment,
+            "width": width,
+            "height": height,
+            "duration": segment_duration(segment),
+            "captions": captions,
+            "editing_style": editing_style,
+            "zoom": zoom_settings() if editing_style == "zoom" else None,
+            "quality": quality,
+            "fps": DRAFT_FPS if draft else VIDEO_FPS,
+            "preset": DRAFT_PRESET if draft else None,  # None keeps the default preset of each encode path
+            "output": f"{segment_dir}/segment_{idx}.mp4"
+        }
+        for idx, segment in enumerate(segments)
+    ]
+
+def concat_segments(segment_files: List[str], output_file: str, audio_file: str, on_progress: Optional[Callable[[float], None]] = None, audio_bitrate: Optional[str] = None):
+    """Join rendered segments with the ffmpeg concat demuxer and add the mixed soundtrack
+
+    For mp4 the video is copied untouched and the soundtrack (see audio_mix.write_soundtrack) is
+    the only thing encoded; other containers are encoded with their OUTPUT_CODECS. on_progress is
+    called with the number of output seconds written so far.
+    """
+    list_file = f"{output_file}.txt"
+    with open(list_file, "w") as f:
+        for path in segment_files:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+
+    codec = OUTPUT_CODECS.get(os.path.splitext(output_file)[1].lstrip("."), ["-c:v", "copy", "-c:a", "aac", "-movflags", "+faststart"])
+    cmd = [
+        ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_file, "-i", audio_file,
+        "-map", "0:v", "-map", "1:a", *codec, *(["-b:a", audio_bitrate] if audio_bitrate else []), output_file
+    ]
+
+    def report(block):
+        if on_progress and block.get("out_time_us", "").isdigit():
+            on_progress(int(block["out_time_us"]) / 1_000_000)
+
+    try:
+        run_ffmpeg(cmd, report, "ffmpeg concat")
+    finally:
+        os.remove(list_file)
+
+def caption_timeline(jobs: List[Dict]) -> List[Dict]:
+    """Get the caption text of each voiced segment with its start and end time in the joined video"""
+    captions = []
+    start = 0
+    for job in jobs:
+        text = job["segment"]["text"]
+        if text and text.strip():
+            captions.append({"text": text, "start": start, "end": start + job["duration"]})
+        start += job["duration"]
+    return captions
+
+def master_dimensions(targets: List[Dict]) -> Tuple[int, int]:
+    """Get the smallest frame that holds every target at full resolution once center-cropped to its aspect ratio"""
+    sizes = [get_render_dimensions(target["resolution"], target["aspect_ratio"]) for target in targets]
+    return max(width for width, _ in sizes), max(height for _, height in sizes)
+
+def derive_outputs(master_file: str, outputs: List[Dict], captions: List[Dict], duration: float, on_progress: Optional[Callable[[float], None]] = None):
+    """Crop and scale a master render into every output in a single ffmpeg run
+
+    outputs are {"path", "width", "height", "format"} dicts. captions are
+    {"text", "start", "end"} dicts; they are burned in per output so each sits at
+    the bottom of its own frame. on_progress gets the seconds written so far.
+    """
+    caption_files = []
+    inputs = ["-i", master_file]
+    filters = [f"[0:v]split={len(outputs)}" + "".join(f"[src{n}]" for n in range(len(outputs)))]
+    output_args = []
+    try:
+        for n, output in enumerate(outputs):
+            width, height = output["width"], output["height"]
+            filters.append(
+                f"[src{n}]crop='min(iw,ih*{width}/{height})':'min(ih,iw*{height}/{width})',"
+                f"scale={width}:{height}:flags=lanczos,setsar=1[out{n}_0]"
+            )
+            video = f"[out{n}_0]"
+            for k, caption in enumerate(captions):
+                # Each caption is rasterized once per output width and shown only during its segment
+                caption_file = f"{output['path']}.caption{k}.png"
+                save_caption(caption["text"], width, caption_file)
+                caption_files.append(caption_file)
+                inputs += ["-i", caption_file]
+                filters.append(
+                    f"{video}[{inputs.count('-i') - 1}:v]overlay=(W-w)/2:H-h-{CAPTION_BOTTOM_PADDING}:"
+                    f"enable='gte(t,{caption['start']})*lt(t,{caption['end']})'[out{n}_{k + 1}]"
+                )
+                video = f"[out{n}_{k + 1}]"
+            filters.append(f"{video}format=yuv420p[v{n}]")
+            codec = OUTPUT_CODECS.get(output["format"], [
+                "-c:v", "libx264", "-preset", DERIVE_PRESET, "-c:a", "copy", "-movflags", "+faststart"
+            ])
+            output_args += ["-map", f"[v{n}]", "-map", "0:a", *codec, "-t", str(duration), output["path"]]
+
+        cmd = [ffmpeg_binary(), "-y", "-loglevel", "error", *inputs, "-filter_complex", ";".join(filters), *output_args]
+
+        def report(block):
+            if on_progress and block.get("out_time_us", "").isdigit():
+                on_progress(int(block["out_time_us"]) / 1_000_000)
+
+        run_ffmpeg(cmd, report, "ffmpeg derive outputs")
+    finally:
+        for caption_file in caption_files:
+            if os.path.exists(caption_file):
+                os.remove(caption_file)
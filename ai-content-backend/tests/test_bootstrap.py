@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+import bootstrap
+
+@pytest.fixture
+def assets_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "assets").mkdir()
+    return tmp_path
+
+def creator(content: bytes):
+    def create(path):
+        with open(path, "wb") as f:
+            f.write(content)
+    return create
+
+def test_assets_from_an_older_version_are_recreated(assets_dir, monkeypatch):
+    monkeypatch.setattr(bootstrap, "BOOTSTRAP_VERSION", 1)
+    bootstrap.ensure_assets({"assets/bed.mp3": creator(b"old")})
+
+    monkeypatch.setattr(bootstrap, "BOOTSTRAP_VERSION", 2)
+    report = bootstrap.ensure_assets({"assets/bed.mp3": creator(b"new")})
+
+    assert report["created"] == ["assets/bed.mp3"]
+    assert (assets_dir / "assets/bed.mp3").read_bytes() == b"new"
+    manifest = json.loads((assets_dir / bootstrap.MANIFEST_PATH).read_text())
+    assert manifest["version"] == 2
+    assert "previous" not in manifest
+
+def test_user_replaced_assets_are_adopted_across_versions(assets_dir, monkeypatch):
+    monkeypatch.setattr(bootstrap, "BOOTSTRAP_VERSION", 1)
+    bootstrap.ensure_assets({"assets/bed.mp3": creator(b"old")})
+    (assets_dir / "assets/bed.mp3").write_bytes(b"the user's own track")
+
+    monkeypatch.setattr(bootstrap, "BOOTSTRAP_VERSION", 2)
+    report = bootstrap.ensure_assets({"assets/bed.mp3": creator(b"new")})
+
+    assert report["adopted"] == ["assets/bed.mp3"]
+    assert (assets_dir / "assets/bed.mp3").read_bytes() == b"the user's own track"
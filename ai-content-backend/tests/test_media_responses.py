@@ -0,0 +1,34 @@
+import pytest
+
+from media_responses import RangeNotSatisfiable, etag_matches, parse_range
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    (" bytes = 0-0 ", (0, 0)),
+])
+def test_single_ranges(header, expected):
+    assert parse_range(header, 1000) == expected
+
+@pytest.mark.parametrize("header", ["bytes=0-1,5-9", "bytes=0-1, 2000-3000", "items=0-1", "bytes=abc", "bytes=-", "bytes=9-5"])
+def test_unsupported_or_malformed_ranges_are_ignored(header):
+    assert parse_range(header, 1000) is None
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+@pytest.mark.parametrize("header, matches", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", W/"abc"', True),
+    ("*", True),
+    ('"x", *', True),
+    ('"abcd"', False),
+])
+def test_if_none_match_uses_weak_comparison(header, matches):
+    assert etag_matches(header, '"abc"') is matches
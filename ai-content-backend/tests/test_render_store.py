@@ -0,0 +1,113 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+import render_store
+from render_store import RenderStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = RenderStore(str(tmp_path / "render_jobs.db"))
+    yield store
+    store.close()
+
+def dead_owner() -> str:
+    """An owner id for a process on this host that has already exited"""
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return f"{socket.gethostname()}:{process.pid}:deadbeef"
+
+def test_claim_leases_jobs_in_priority_order(store):
+    store.enqueue(1, {"n": 1}, "final", 1)
+    store.enqueue(2, {"n": 2}, "draft", -1)
+
+    job = store.claim("owner")
+    assert job["video_id"] == 2
+    assert job["state"] == "rendering"
+    assert job["attempts"] == 1
+    assert job["lease_owner"] == "owner"
+    assert store.claim("owner")["video_id"] == 1
+    assert store.claim("owner") is None
+
+def test_claim_skips_videos_already_rendering(store):
+    store.enqueue(1, {"quality": "final"}, "final", 1)
+    store.claim("owner")
+    store.enqueue(1, {"quality": "draft"}, "draft", -1)
+
+    assert store.claim("owner") is None
+
+def test_enqueue_folds_into_queued_job(store):
+    first = store.enqueue(1, {"n": 1}, "final", 1)
+    second = store.enqueue(1, {"n": 2}, "preview", 0, ("preview", "final"))
+
+    assert second["job_id"] == first["job_id"]
+    assert second["request"] == {"n": 2}
+    assert second["priority"] == "preview"
+    assert len(store.queued_jobs()) == 1
+
+def test_heartbeat_only_extends_own_lease(store):
+    store.enqueue(1, {}, "final", 1)
+    job = store.claim("owner")
+
+    assert store.heartbeat(job["job_id"], "owner")
+    assert not store.heartbeat(job["job_id"], "someone-else")
+    store.finish(job["job_id"], "owner", "ready", {"ok": True})
+    assert not store.heartbeat(job["job_id"], "owner")
+    assert store.latest_job(1)["result"] == {"ok": True}
+
+def test_expired_lease_is_requeued(store, monkeypatch):
+    store.enqueue(1, {}, "final", 1)
+    monkeypatch.setattr(render_store, "LEASE_SECONDS", -1)
+    job = store.claim(f"{socket.gethostname()}:1:live")  # pid 1 is alive, so only the lease can expire
+
+    assert store.requeue_interrupted() == 1
+    requeued = store.latest_job(1)
+    assert requeued["state"] == "queued"
+    assert requeued["lease_owner"] is None
+    assert store.claim("owner")["job_id"] == job["job_id"]
+
+def test_live_lease_is_not_requeued(store):
+    store.enqueue(1, {}, "final", 1)
+    store.claim(render_store.worker_owner_id())
+
+    assert store.requeue_interrupted() == 0
+    assert store.latest_job(1)["state"] == "rendering"
+
+def test_earlier_process_with_our_pid_is_requeued(store):
+    store.enqueue(1, {}, "final", 1)
+    store.claim(f"{socket.gethostname()}:{os.getpid()}:0ldn0nce")
+
+    assert store.requeue_interrupted() == 1
+    assert store.latest_job(1)["state"] == "queued"
+
+def test_dead_owner_is_requeued_before_lease_expires(store):
+    store.enqueue(1, {}, "final", 1)
+    store.claim(dead_owner())
+
+    assert store.requeue_interrupted() == 1
+    assert store.latest_job(1)["state"] == "queued"
+
+def test_job_fails_after_max_attempts(store, monkeypatch):
+    monkeypatch.setattr(render_store, "LEASE_SECONDS", -1)
+    store.enqueue(1, {}, "final", 1)
+    for _ in range(render_store.MAX_ATTEMPTS):
+        assert store.claim("owner") is not None
+        store.requeue_interrupted()
+
+    job = store.latest_job(1)
+    assert job["state"] == "error"
+    assert job["error"] == "Render interrupted too many times"
+    assert store.claim("owner") is None
+
+def test_stale_finish_is_ignored(store, monkeypatch):
+    monkeypatch.setattr(render_store, "LEASE_SECONDS", -1)
+    store.enqueue(1, {}, "final", 1)
+    job = store.claim("first")
+    store.requeue_interrupted()
+    store.claim("second")
+
+    store.finish(job["job_id"], "first", "ready")
+    assert store.latest_job(1)["state"] == "rendering"
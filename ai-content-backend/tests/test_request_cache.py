@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+import pytest
+
+import request_cache
+from request_cache import MemoryCache, RequestCache
+
+def make_cache():
+    store = {}
+    return RequestCache("test", store.get, store.__setitem__), store
+
+def test_cancelled_owner_does_not_cancel_waiters():
+    cache, store = make_cache()
+    calls = []
+
+    async def request():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        owner = asyncio.ensure_future(cache.get("key", request, "upstream"))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get("key", request, "upstream"))
+        await asyncio.sleep(0)
+        owner.cancel()
+        result = await waiter
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return result
+
+    assert asyncio.run(scenario()) == "result"
+    assert len(calls) == 1
+    assert store == {"key": "result"}
+    assert cache.stats["coalesced"] == 1
+    assert cache.inflight == {}
+
+def test_cached_result_is_reused_unless_forced():
+    cache, _ = make_cache()
+    calls = []
+
+    async def request():
+        calls.append(1)
+        return len(calls)
+
+    async def scenario():
+        first = await cache.get("key", request, "upstream")
+        second = await cache.get("key", request, "upstream")
+        forced = await cache.get("key", request, "upstream", force=True)
+        return first, second, forced
+
+    assert asyncio.run(scenario()) == (1, 1, 2)
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 2
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    cache, store = make_cache()
+
+    async def request():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get("key", request, "upstream"), cache.get("key", request, "upstream"), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert store == {}
+    assert cache.inflight == {}
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(2, ttl=60)
+    assert cache.set("a", 1) == 0
+    cache.set("b", 2)
+    cache.get("a")
+    assert cache.set("c", 3) == 1
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+def test_memory_cache_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(request_cache.time, "monotonic", lambda: now[0])
+    cache = MemoryCache(10, ttl=60)
+    cache.set("a", 1)
+    now[0] += 59
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_offloaded_reads_and_writes_run_off_the_event_loop():
+    threads = []
+    store = {}
+
+    def read(key):
+        threads.append(threading.get_ident())
+        return store.get(key)
+
+    def write(key, value):
+        threads.append(threading.get_ident())
+        store[key] = value
+
+    cache = RequestCache("test", read, write, offload=True)
+
+    async def request():
+        return "result"
+
+    async def scenario():
+        return threading.get_ident(), await cache.get("key", request, "upstream"), await cache.get("key", request, "upstream")
+
+    loop_thread, first, second = asyncio.run(scenario())
+    assert (first, second) == ("result", "result")
+    assert len(threads) == 3
+    assert loop_thread not in threads
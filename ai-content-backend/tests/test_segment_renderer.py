@@ -0,0 +1,18 @@
+import pytest
+
+from segment_renderer import DEFAULT_BACKGROUND, background_color
+
+@pytest.mark.parametrize("background, expected", [
+    ("#1A2b3C", "1A2b3C"),
+    ("ffffff", "ffffff"),
+    (None, DEFAULT_BACKGROUND.lstrip("#")),
+    ("#fff", DEFAULT_BACKGROUND.lstrip("#")),
+    ("#000000,drawtext=text=x", DEFAULT_BACKGROUND.lstrip("#")),
+    ("#000000\n", DEFAULT_BACKGROUND.lstrip("#")),
+    (0x000000, DEFAULT_BACKGROUND.lstrip("#")),
+])
+def test_background_color_only_passes_hex_colors(background, expected):
+    assert background_color({"background": background}) == expected
+
+def test_background_color_defaults_when_missing():
+    assert background_color({}) == DEFAULT_BACKGROUND.lstrip("#")
@@ -0,0 +1,79 @@
+from fastapi import HTTPException
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+import asyncio
+from typing import Dict
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", 1))
+WHISPER_MAX_PENDING = int(os.getenv("WHISPER_MAX_PENDING", 16))
+WHISPER_PRELOAD = os.getenv("WHISPER_PRELOAD", "0") == "1"
+
+# One resident model per worker: whisper installs decoding hooks on the model,
+# so a single instance must not be shared by concurrent transcriptions
+model_pool = None
+load_lock = asyncio.Lock()
+executor = ThreadPoolExecutor(max_workers=WHISPER_WORKERS, thread_name_prefix="whisper")
+pending = 0
+
+def load_model():
+    """Load a whisper model (imported here so the API starts without torch)"""
+    import whisper
+    return whisper.load_model(WHISPER_MODEL)
+
+async def get_model_pool() -> asyncio.Queue:
+    """Load the model pool on first use and keep it resident"""
+    global model_pool
+    async with load_lock:
+        if model_pool is None:
+            loop = asyncio.get_running_loop()
+            pool = asyncio.Queue()
+            for _ in range(WHISPER_WORKERS):
+                pool.put_nowait(await loop.run_in_executor(executor, load_model))
+            model_pool = pool
+    return model_pool
+
+async def warm_up():
+    """Load the models in the background so the first upload does not pay for it"""
+    try:
+        await get_model_pool()
+    except Exception as e:
+        print(f"Could not preload whisper model: {e}")
+
+async def transcribe(audio_path: str) -> Dict:
+    """Transcribe a file on the next free resident model"""
+    global pending
+    if pending >= WHISPER_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Transcription queue is full, try again shortly")
+    pending += 1
+    try:
+        queued_at = time.perf_counter()
+        pool = await get_model_pool()
+        model = await pool.get()
+        started_at = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(executor, model.transcribe, audio_path)
+        finally:
+            pool.put_nowait(model)
+        finished_at = time.perf_counter()
+    finally:
+        pending -= 1
+
+    return {
+        "text": result["text"],
+        "model": WHISPER_MODEL,
+        "queue_wait_ms": round((started_at - queued_at) * 1000, 1),
+        "inference_ms": round((finished_at - started_at) * 1000, 1)
+    }
+
+def get_transcriber_stats() -> Dict:
+    """Get model pool and queue counters"""
+    return {
+        "model": WHISPER_MODEL,
+        "workers": WHISPER_WORKERS,
+        "loaded": model_pool is not None,
+        "idle_models": model_pool.qsize() if model_pool else 0,
+        "pending": pending,
+        "max_pending": WHISPER_MAX_PENDING
+    }
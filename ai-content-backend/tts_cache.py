@@ -0,0 +1,96 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+import file_cache
+from typing import Dict, List, Optional
+
+TTS_CACHE_DIR = "assets/audio/tts"
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 256 * 1024 ** 2))  # 256 MB
+TTS_PREFETCH_CONCURRENCY = int(os.getenv("TTS_PREFETCH_CONCURRENCY", 8))
+
+os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+
+gTTS = None  # Imported on the first cache miss to keep API startup fast
+tts_stats = {"hits": 0, "misses": 0, "evictions": 0}
+tts_lock = threading.Lock()
+
+def tts_cache_key(text: str, lang: str = "en", tld: str = "us", voice: Optional[int] = None, slow: bool = False) -> str:
+    """Hash the text and every voice setting that changes the synthesized audio"""
+    payload = {"text": text.strip(), "lang": lang, "tld": tld, "voice": voice, "slow": slow}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def load_gtts():
+    """Import gTTS on first use"""
+    global gTTS
+    if gTTS is None:
+        from gtts import gTTS as gtts_class
+        gTTS = gtts_class
+    return gTTS
+
+def synthesize(text: str, lang: str = "en", tld: str = "us", voice: Optional[int] = None, slow: bool = False, pin: bool = False) -> str:
+    """Get the mp3 for a line of text, calling gTTS only on a cache miss
+
+    With pin, the file is kept from eviction until the caller releases it.
+    """
+    path = f"{TTS_CACHE_DIR}/{tts_cache_key(text, lang, tld, voice, slow)}.mp3"
+    with tts_lock:
+        if os.path.exists(path):
+            os.utime(path)  # mtime doubles as the LRU timestamp
+            tts_stats["hits"] += 1
+            return file_cache.pin(path) if pin else path
+        tts_stats["misses"] += 1
+
+    # gTTS has no voice selection, so the voice only namespaces the cache entry
+    tts = load_gtts()(text=text.strip(), lang=lang, tld=tld, slow=slow)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        tts.save(temp_path)
+        with tts_lock:
+            os.replace(temp_path, path)  # Never expose a half-written file to other renders
+            if pin:
+                file_cache.pin(path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return path
+
+async def prefetch(texts: List[str], lang: str = "en", tld: str = "us", voice: Optional[int] = None, slow: bool = False, pin: bool = False) -> Dict[str, str]:
+    """Synthesize all distinct texts concurrently and return a text -> mp3 path map
+
+    With pin, every returned file is pinned once; if any text fails, the files already pinned are released.
+    """
+    semaphore = asyncio.Semaphore(TTS_PREFETCH_CONCURRENCY)
+    unique_texts = list(dict.fromkeys(text for text in texts if text and text.strip()))
+
+    async def fetch(text):
+        async with semaphore:
+            return await asyncio.to_thread(synthesize, text, lang, tld, voice, slow, pin)
+
+    results = await asyncio.gather(*[fetch(text) for text in unique_texts], return_exceptions=True)
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        if pin:
+            release([result for result in results if not isinstance(result, BaseException)])
+        raise failures[0]
+    return dict(zip(unique_texts, results))
+
+def release(paths: List[str]):
+    """Unpin audio files returned by a pinned synthesize or prefetch"""
+    file_cache.release(paths)
+
+def evict():
+    """Delete least recently used audio not in use until the cache fits in TTS_CACHE_MAX_BYTES"""
+    with tts_lock:
+        tts_stats["evictions"] += file_cache.evict_lru(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, ".mp3")
+
+def get_tts_stats():
+    """Get hit/miss counters and the current size of the TTS cache"""
+    files = [entry for entry in os.scandir(TTS_CACHE_DIR) if entry.is_file()]
+    return {
+        **tts_stats,
+        "entries": len(files),
+        "size_bytes": sum(entry.stat().st_size for entry in files),
+        "max_bytes": TTS_CACHE_MAX_BYTES
+    }
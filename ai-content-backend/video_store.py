@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import asyncio
+import threading
+from typing import Dict, Iterator, List, Optional
+
+TIMELINE_DIR = "projects"
+# Autosaves within this window after the first unsaved change are written once
+TIMELINE_FLUSH_DELAY = float(os.getenv("TIMELINE_FLUSH_DELAY", 2.0))
+
+class VideoRepository:
+    """Videos indexed by id, with secondary indexes on status and creation time"""
+
+    def __init__(self, videos: Optional[List[Dict]] = None):
+        self.videos = {}  # id -> video, in insertion order
+        self.by_status = {}  # status -> set of ids
+        self.by_created = []  # Sorted (created_at, id) pairs
+        self.lock = threading.RLock()
+        for video in videos or []:
+            self.add(video)
+
+    def add(self, video: Dict) -> Dict:
+        """Insert a video, stamping created_at if it has none"""
+        with self.lock:
+            video = {**video}
+            video.setdefault("created_at", time.time())
+            if video["id"] in self.videos:
+                self.remove(video["id"])
+            self.videos[video["id"]] = video
+            self.by_status.setdefault(video["status"], set()).add(video["id"])
+            bisect.insort(self.by_created, (video["created_at"], video["id"]))
+            return {**video}
+
+    def remove(self, video_id: int):
+        """Delete a video and its index entries"""
+        with self.lock:
+            video = self.videos.pop(video_id)
+            self.by_status[video["status"]].discard(video_id)
+            self.by_created.remove((video["created_at"], video_id))
+
+    def get(self, video_id: int) -> Optional[Dict]:
+        """Get a copy of a video, or None"""
+        video = self.videos.get(video_id)
+        return {**video} if video else None
+
+    def exists(self, video_id: int) -> bool:
+        """Check whether a video exists"""
+        return video_id in self.videos
+
+    def update(self, video_id: int, **fields) -> Optional[Dict]:
+        """Atomically update fields of a video, keeping the status index in sync"""
+        with self.lock:
+            video = self.videos.get(video_id)
+            if video is None:
+                return None
+            if "status" in fields and fields["status"] != video["status"]:
+                self.by_status[video["status"]].discard(video_id)
+                self.by_status.setdefault(fields["status"], set()).add(video_id)
+            video.update(fields)
+            return {**video}
+
+    def all(self) -> List[Dict]:
+        """Get every video in insertion order"""
+        with self.lock:
+            return [{**video} for video in self.videos.values()]
+
+    def with_status(self, status: str) -> List[Dict]:
+        """Get the videos in a status"""
+        with self.lock:
+            return [{**self.videos[video_id]} for video_id in self.by_status.get(status, ())]
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        """Get the most recently created videos, newest first"""
+        with self.lock:
+            return [{**self.videos[video_id]} for _, video_id in reversed(self.by_created[-limit:])]
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+def is_valid_timeline(timeline) -> bool:
+    """Check that a timeline has the shape the editor and renderer rely on"""
+    return (
+        isinstance(timeline, dict)
+        and isinstance(timeline.get("segments"), list)
+        and all(isinstance(segment, dict) and "text" in segment for segment in timeline["segments"])
+    )
+
+def write_json_atomic(path: str, data: str):
+    """Write a file via a temp file and rename, so readers never see a torn file"""
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_path, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+class TimelineRepository:
+    """Timelines keyed by video id, with a segment id -> video id index
+
+    Timelines are served from memory. Changes are written behind to
+    projects/timeline_{id}.json: the first change schedules one flush after
+    TIMELINE_FLUSH_DELAY, and every change made before it runs goes out in
+    that same write.
+    """
+
+    def __init__(self, directory: str = TIMELINE_DIR, flush_delay: float = TIMELINE_FLUSH_DELAY):
+        self.timelines = {}
+        self.segment_index = {}
+        self.lock = threading.RLock()
+        self.directory = directory
+        self.flush_delay = flush_delay
+        self.dirty = set()
+        self.pending_flushes = {}  # video_id -> scheduled flush task
+        self.stats = {"writes": 0, "coalesced": 0, "load_errors": 0}
+
+    def path(self, video_id: int) -> str:
+        return os.path.join(self.directory, f"timeline_{video_id}.json")
+
+    def set(self, video_id: int, timeline: Dict, persist: bool = True) -> Dict:
+        """Store a timeline, reindex its segments and schedule it to be written"""
+        with self.lock:
+            self.discard_segments(video_id)
+            self.timelines[video_id] = timeline
+            self.index_segments(video_id)
+        if persist:
+            self.mark_dirty(video_id)
+        return timeline
+
+    def index_segments(self, video_id: int):
+        for segment in self.timelines[video_id].get("segments", []):
+            if "id" in segment:
+                self.segment_index[segment["id"]] = video_id
+
+    def discard_segments(self, video_id: int):
+        """Drop the segment index entries of a timeline"""
+        for segment in self.timelines.get(video_id, {}).get("segments", []):
+            if "id" in segment and self.segment_index.get(segment["id"]) == video_id:
+                del self.segment_index[segment["id"]]
+
+    def mark_dirty(self, video_id: int):
+        """Schedule a write-behind flush for a timeline changed in place"""
+        with self.lock:
+            self.index_segments(video_id)
+            self.dirty.add(video_id)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_now(video_id)  # No event loop (scripts): write straight away
+            return
+        if video_id in self.pending_flushes:
+            self.stats["coalesced"] += 1
+            return
+        self.pending_flushes[video_id] = loop.create_task(self.delayed_flush(video_id))
+
+    async def delayed_flush(self, video_id: int):
+        try:
+            await asyncio.sleep(self.flush_delay)
+        finally:
+            self.pending_flushes.pop(video_id, None)
+        await self.flush_one(video_id)
+
+    def snapshot(self, video_id: int) -> Optional[str]:
+        """Serialize a dirty timeline and mark it clean"""
+        with self.lock:
+            if video_id not in self.dirty:
+                return None
+            self.dirty.discard(video_id)
+            return json.dumps(self.timelines[video_id])
+
+    async def flush_one(self, video_id: int):
+        # Serialized on the event loop so in-place edits are not seen half-applied; written off it
+        data = self.snapshot(video_id)
+        if data is None:
+            return
+        try:
+            await asyncio.to_thread(write_json_atomic, self.path(video_id), data)
+            self.stats["writes"] += 1
+        except Exception as e:
+            print(f"Could not save timeline {video_id}: {e}")
+            with self.lock:
+                self.dirty.add(video_id)
+
+    def flush_now(self, video_id: int):
+        data = self.snapshot(video_id)
+        if data is not None:
+            write_json_atomic(self.path(video_id), data)
+            self.stats["writes"] += 1
+
+    async def flush(self):
+        """Write every pending change now (called at shutdown)"""
+        for task in list(self.pending_flushes.values()):
+            task.cancel()
+        self.pending_flushes.clear()
+        for video_id in list(self.dirty):
+            await self.flush_one(video_id)
+
+    def load(self, video_id: int) -> Optional[Dict]:
+        """Read and validate a timeline file into memory, or None if it is missing or invalid"""
+        try:
+            with open(self.path(video_id)) as f:
+                timeline = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Could not read timeline {video_id}: {e}")
+            self.stats["load_errors"] += 1
+            return None
+        if not is_valid_timeline(timeline):
+            print(f"Ignoring malformed timeline file for video {video_id}")
+            self.stats["load_errors"] += 1
+            return None
+        return self.set(video_id, timeline, persist=False)
+
+    def load_all(self) -> int:
+        """Warm-load every saved timeline (called at startup); returns how many were loaded"""
+        loaded = 0
+        os.makedirs(self.directory, exist_ok=True)
+        for filename in sorted(os.listdir(self.directory)):
+            if not (filename.startswith("timeline_") and filename.endswith(".json")):
+                continue
+            key = filename[len("timeline_"):-len(".json")]
+            video_id = int(key) if key.isdigit() else key
+            if video_id not in self.timelines and self.load(video_id) is not None:
+                loaded += 1
+        return loaded
+
+    def get(self, video_id: int, default: Optional[Dict] = None) -> Optional[Dict]:
+        """Get the timeline of a video"""
+        return self.timelines.get(video_id, default)
+
+    def find_segment(self, segment_id: str):
+        """Get (video_id, timeline, segment) for a segment id, or None"""
+        with self.lock:
+            video_id = self.segment_index.get(segment_id)
+            if video_id is None:
+                return None
+            timeline = self.timelines[video_id]
+            for segment in timeline["segments"]:
+                if segment["id"] == segment_id:
+                    return video_id, timeline, segment
+            return None
+
+    def get_stats(self) -> Dict:
+        """Get write-behind counters"""
+        return {**self.stats, "timelines": len(self.timelines), "dirty": len(self.dirty), "flush_delay": self.flush_delay}
+
+    def __contains__(self, video_id: int) -> bool:
+        return video_id in self.timelines
+
+    def __getitem__(self, video_id: int) -> Dict:
+        return self.timelines[video_id]
+
+    def __setitem__(self, video_id: int, timeline: Dict):
+        self.set(video_id, timeline)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.timelines)
+
+    def items(self):
+        return self.timelines.items()